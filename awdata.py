@@ -0,0 +1,896 @@
+import datetime
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+import backends
+import rollup
+import sharedcache
+from instrumentation import describe_result, measure, wait_percentiles
+
+
+def get_setting(name, default=None):
+    # AWDASH_<NAME> environment variables take precedence, which lets scripts such
+    # as benchmark.py point the loaders at another database
+    value = os.environ.get(f"AWDASH_{name}")
+    if value is not None:
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError:
+        return default
+
+def get_backend(name=None):
+    # DB_BACKEND "duckdb" or "sqlite" serves the dashboard from a snapshot written by snapshot.py
+    return load_backend(name or get_setting("DB_BACKEND", "mysql"))
+
+@st.cache_resource
+def load_backend(name):
+    # One instance per process, shared by the pool, read_sql and the error handlers
+    if name == "mysql":
+        return backends.MySQLBackend(
+            host=str(get_setting("DB_HOST")),
+            port=int(get_setting("DB_PORT")),
+            user=str(get_setting("DB_USER")),
+            password=str(get_setting("DB_PASSWORD")),
+            database=str(get_setting("DB_DATABASE")),
+            # FETCH_MODE "pandas" goes back to pd.read_sql, e.g. to compare with bench_fetch.py
+            fetch_mode=get_setting("FETCH_MODE", "columnar"),
+        )
+    return backends.BACKENDS[name](str(get_setting("DB_PATH", f"awdash.{name}")))
+
+def database_errors(backend=None):
+    return (backend or get_backend()).errors + (pd.errors.DatabaseError, ConnectionError)
+
+def read_sql(name, query, conn, params=None, **kwargs):
+    with measure("query", name) as record:
+        result = get_backend().read(conn, query, params, **kwargs)
+        describe_result(record, result)
+    return result
+
+def create_connection(backend=None):
+    backend = backend or get_backend()
+    try:
+        with measure("connection", "create_connection"):
+            conn = backend.connect()
+        return conn
+    except backend.errors as err:
+        st.error(f"Error: {err}")
+        return None
+
+class ConnectionPool:
+    def __init__(self, backend, max_size=5, max_idle=300, timeout=30):
+        self.backend = backend
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._wait_times = deque(maxlen=1000)
+        self._created = 0
+        self._recycled = 0
+        self._timeouts = 0
+
+    def acquire(self):
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        with self._lock:
+            self._wait_times.append(time.perf_counter() - start)
+            if not acquired:
+                self._timeouts += 1
+        if not acquired:
+            st.error("Error: timed out waiting for a database connection")
+            return None
+
+        conn = self._take_idle()
+        if conn is None:
+            conn = create_connection(self.backend)
+            if conn is None:
+                self._slots.release()
+                return None
+            with self._lock:
+                self._created += 1
+        return conn
+
+    def release(self, conn):
+        try:
+            self.backend.reset(conn)
+            self._idle.put((conn, time.monotonic()))
+        except self.backend.errors:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def _take_idle(self):
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if time.monotonic() - last_used > self.max_idle or not self.backend.is_alive(conn):
+                self._discard(conn)
+                continue
+            return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._recycled += 1
+        try:
+            conn.close()
+        except self.backend.errors:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "idle": self._idle.qsize(),
+                "created": self._created,
+                "recycled": self._recycled,
+                "timeouts": self._timeouts,
+                "acquisitions": len(self._wait_times),
+                **wait_percentiles(self._wait_times),
+            }
+
+@st.cache_resource
+def get_connection_pool():
+    return ConnectionPool(
+        get_backend(),
+        max_size=int(get_setting("DB_POOL_SIZE", 5)),
+        max_idle=float(get_setting("DB_POOL_MAX_IDLE", 300)),
+        timeout=float(get_setting("DB_POOL_TIMEOUT", 30)),
+    )
+
+@contextmanager
+def borrow_connection():
+    pool = get_connection_pool()
+    with measure("connection", "pool_acquire"):
+        conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            pool.release(conn)
+
+class ResultCache:
+    def __init__(self, ttl=3600, max_bytes=256 * 2**20, invalidation_file=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.invalidation_file = invalidation_file
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._waits = 0
+        self._wait_times = deque(maxlen=1000)
+        self._flights = {}
+        self._invalidation_mtime = self._read_invalidation_mtime()
+
+    def get(self, key):
+        found, value = self._lookup(key)
+        with self._lock:
+            if found:
+                self._hits += 1
+            else:
+                self._misses += 1
+        return found, value
+
+    def _lookup(self, key):
+        self._check_invalidation()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[2]
+
+    def get_or_compute(self, key, compute):
+        # Single flight: concurrent callers of a missing key wait for the first one's
+        # result instead of all running the same queries
+        found, value = self.get(key)
+        if found:
+            return 'hit', value
+        with self._flight(key) as waited:
+            found, value = self._lookup(key)
+            if found:
+                return 'wait' if waited else 'hit', value
+            value = compute()
+            # Failed loads come back as None and must not be cached
+            if value is not None:
+                self.put(key, value)
+            return 'miss', value
+
+    @contextmanager
+    def _flight(self, key):
+        with self._lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            waited = not flight[0].acquire(blocking=False)
+            if waited:
+                start = time.perf_counter()
+                flight[0].acquire()
+                self._record_wait(time.perf_counter() - start)
+            try:
+                yield waited
+            finally:
+                flight[0].release()
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if flight[1] == 0:
+                    del self._flights[key]
+
+    def _record_wait(self, seconds):
+        with self._lock:
+            self._waits += 1
+            self._wait_times.append(seconds)
+
+    def put(self, key, value):
+        size = result_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while self._entries and self._bytes + size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+
+    def clear(self, page=None):
+        with self._lock:
+            for key in [key for key in self._entries if page is None or key[0] == page]:
+                self._remove(key)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _read_invalidation_mtime(self):
+        if not self.invalidation_file:
+            return None
+        try:
+            return os.stat(self.invalidation_file).st_mtime
+        except OSError:
+            return None
+
+    def _check_invalidation(self):
+        # The nightly ETL touches this file when it finishes loading
+        mtime = self._read_invalidation_mtime()
+        if mtime != self._invalidation_mtime:
+            self._invalidation_mtime = mtime
+            self.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "waits": self._waits,
+                "evictions": self._evictions,
+                **wait_percentiles(self._wait_times),
+            }
+
+def result_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (tuple, list)):
+        return sum(result_size(part) for part in value)
+    return sys.getsizeof(value)
+
+@st.cache_resource
+def get_result_cache():
+    options = dict(
+        ttl=float(get_setting("CACHE_TTL", 3600)),
+        max_bytes=int(float(get_setting("CACHE_MAX_MB", 256)) * 2**20),
+        invalidation_file=get_setting("CACHE_INVALIDATION_FILE"),
+    )
+    # CACHE_BACKEND "shared" lets every dashboard process on the host share one cache
+    if get_setting("CACHE_BACKEND", "memory") == "shared":
+        return sharedcache.SharedResultCache(get_setting("CACHE_PATH", ".result_cache/cache.sqlite"), **options)
+    return ResultCache(**options)
+
+Dataset = namedtuple('Dataset', ['func', 'params', 'depends', 'cached', 'when'])
+
+DATASETS = {}
+
+def dataset(name, params=(), depends=(), cached=True, when=None):
+    # A name may be registered more than once; the first variant whose `when` accepts
+    # the page parameters is used, e.g. the cube-backed one when a fresh cube exists
+    def decorator(func):
+        DATASETS.setdefault(name, []).append(Dataset(func, tuple(params), tuple(depends), cached, when))
+        return func
+    return decorator
+
+def dataset_parts(names, dependency, params=(), when=None):
+    # Registers one dataset per element of a tuple-valued dependency
+    for index, name in enumerate(names):
+        def select(index=index, **inputs):
+            return inputs[dependency][index]
+        dataset(name, params=params, depends=(dependency,), when=when)(select)
+
+class DatasetContext:
+    # Holds the datasets of one page render. Nothing is evaluated until a chart asks
+    # for it, and each dataset is evaluated at most once per context.
+    def __init__(self, **params):
+        self.params = params
+        self._values = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._values:
+                self._values[name] = self._evaluate(name)
+            return self._values[name]
+
+    def prefetch(self, *names):
+        # Each render fans out on its own QUERY_PARALLELISM workers, so one busy session
+        # doesn't hold up the others' queries
+        ctx = get_script_run_ctx(suppress_warning=True)
+
+        def attach_context():
+            if ctx is not None:
+                add_script_run_ctx(threading.current_thread(), ctx)
+
+        max_workers = max(1, min(len(names), int(get_setting("QUERY_PARALLELISM", 4))))
+        executor = ThreadPoolExecutor(max_workers=max_workers, initializer=attach_context, thread_name_prefix="dataset")
+        futures = {executor.submit(self.get, name): name for name in names}
+        # The workers exit once the submitted datasets are done
+        executor.shutdown(wait=False)
+        return futures
+
+    def _spec(self, name):
+        for spec in DATASETS[name]:
+            if spec.when is None or spec.when(self.params):
+                return spec
+        raise KeyError(name)
+
+    def _evaluate(self, name):
+        spec = self._spec(name)
+        params = {param: self.params[param] for param in spec.params}
+        if not spec.cached:
+            return self._call(spec, params)
+
+        cache = get_result_cache()
+        key = (name,) + tuple(params.values())
+        with measure("dataset", name) as record:
+            # Looked up before the dependencies so a hit doesn't pay for them
+            record['cache'], result = cache.get_or_compute(key, lambda: self._call(spec, params))
+            return result
+
+    def _call(self, spec, params):
+        inputs = {dependency: self.get(dependency) for dependency in spec.depends}
+        if any(value is None for value in inputs.values()):
+            return None
+        return spec.func(**params, **inputs)
+
+def run_query(query, **kwargs):
+    # Each query borrows its own pooled connection, so DB_POOL_SIZE also bounds
+    # the total number of queries in flight across sessions
+    with borrow_connection() as conn:
+        if conn is None:
+            return None
+        try:
+            return query(conn, **kwargs)
+        except database_errors() as err:
+            st.error(f"Error: {err}")
+            return None
+
+class CalendarIndex:
+    # Assumes dimtime surrogate keys increase with the date, as they do in AdventureWorks,
+    # so any date range maps to one contiguous OrderDateKey range
+    def __init__(self, dimtime):
+        dimtime = dimtime.assign(FullDateAlternateKey=pd.to_datetime(dimtime['FullDateAlternateKey']))
+        dimtime = dimtime.sort_values('FullDateAlternateKey')
+        self.keys = dimtime['TimeKey'].to_numpy()
+        self.dates = dimtime['FullDateAlternateKey'].to_numpy()
+        self._months = pd.Series(dimtime['FullDateAlternateKey'].dt.month.to_numpy(), index=self.keys)
+
+    def range_bounds(self, start, end):
+        lo = np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left')
+        hi = np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right') - 1
+        if hi < lo:
+            # Empty range; BETWEEN 0 AND -1 matches nothing
+            return 0, -1
+        return int(self.keys[lo]), int(self.keys[hi])
+
+    def year_bounds(self, year):
+        return self.range_bounds(datetime.date(year, 1, 1), datetime.date(year, 12, 31))
+
+    def year_dates(self, year):
+        in_year = (self.dates >= np.datetime64(f"{year}-01-01")) & (self.dates < np.datetime64(f"{year + 1}-01-01"))
+        dates = pd.to_datetime(self.dates[in_year])
+        return dates.min().date(), dates.max().date()
+
+    def months(self, keys):
+        return self._months.reindex(keys).to_numpy()
+
+def dimension_generation():
+    # Changes when the nightly ETL touches CACHE_INVALIDATION_FILE and at least every
+    # CACHE_TTL seconds, so replicas that didn't see a Refresh still pick up new rows.
+    # The TTL windows are aligned to the epoch, so every replica reloads at the same time.
+    path = get_setting("CACHE_INVALIDATION_FILE")
+    try:
+        mtime = os.stat(path).st_mtime if path else None
+    except OSError:
+        mtime = None
+    return mtime, int(time.time() // float(get_setting("CACHE_TTL", 3600)))
+
+@st.cache_resource(max_entries=1)
+def load_calendar_index(generation=None):
+    with borrow_connection() as conn:
+        if conn is None:
+            raise ConnectionError("no database connection")
+        query_dimtime = """
+        SELECT TimeKey, FullDateAlternateKey
+        FROM dimtime
+        """
+        return CalendarIndex(read_sql("dimtime", query_dimtime, conn))
+
+def get_calendar_index():
+    try:
+        return load_calendar_index(dimension_generation())
+    except database_errors() as err:
+        st.error(f"Error: {err}")
+        return None
+
+def refresh_data():
+    if get_setting("USE_CUBE", False):
+        with borrow_connection() as conn:
+            if conn is not None:
+                try:
+                    rollup.refresh_cube(conn, get_setting("CUBE_DIR", ".cube"), age_as_of())
+                except database_errors() as err:
+                    st.error(f"Error: {err}")
+    get_result_cache().clear()
+    load_calendar_index.clear()
+    get_customer_attributes.clear()
+
+COUNTRY_NAMES = {
+    'United States': 'USA',
+    'United Kingdom': 'UK'
+}
+
+def short_country_names(df_top_sales_by_country):
+    return df_top_sales_by_country.assign(SalesTerritoryCountry=df_top_sales_by_country['SalesTerritoryCountry'].replace(COUNTRY_NAMES))
+
+def query_sales(conn, key_range):
+    query_sales = """
+    SELECT 
+        SUM(SalesAmount) AS TotalSales, 
+        SUM(OrderQuantity) AS TotalQuantity,
+        SUM(SalesAmount - TotalProductCost) AS Profit,
+        SUM(SalesAmount - TotalProductCost) / SUM(SalesAmount) * 100 AS ProfitPercentage
+    FROM factinternetsales
+    WHERE factinternetsales.OrderDateKey BETWEEN %s AND %s
+    """
+    df_sales = read_sql("sales", query_sales, conn, params=key_range)
+    return df_sales
+
+def query_sales_by_month(conn, key_range, calendar):
+    query_sales_by_month = """
+    SELECT 
+        factinternetsales.OrderDateKey,
+        SUM(factinternetsales.SalesAmount) AS Sales,
+        SUM(factinternetsales.OrderQuantity) AS Quantity
+    FROM factinternetsales
+    WHERE factinternetsales.OrderDateKey BETWEEN %s AND %s
+    GROUP BY factinternetsales.OrderDateKey
+    """
+    df_sales_by_day = read_sql("sales_by_month", query_sales_by_month, conn, params=key_range)
+    df_sales_by_month = (
+        df_sales_by_day.assign(Month=calendar.months(df_sales_by_day['OrderDateKey']))
+        .groupby('Month')[['Sales', 'Quantity']].sum()
+        .reset_index()
+        .astype({'Month': 'int64'})
+    )
+    return df_sales_by_month
+
+def query_sales_by_product_territory(conn, key_range):
+    query = """
+    SELECT 
+        SUM(SalesAmount) AS TotalSales, 
+        SUM(SalesAmount - TotalProductCost) AS Profit,
+        dimproduct.EnglishProductName AS Product,
+        dimsalesterritory.SalesTerritoryCountry AS Territory
+    FROM factinternetsales
+    JOIN dimproduct ON factinternetsales.ProductKey = dimproduct.ProductKey
+    JOIN dimsalesterritory ON factinternetsales.SalesTerritoryKey = dimsalesterritory.SalesTerritoryKey
+    WHERE factinternetsales.OrderDateKey BETWEEN %s AND %s
+    GROUP BY dimproduct.EnglishProductName, dimsalesterritory.SalesTerritoryCountry
+    """
+    df = read_sql("sales_by_product_territory", query, conn, params=key_range)
+    return df
+
+def query_sales_by_category(conn, key_range):
+    query_sales_by_category = """
+    SELECT 
+        dimproductcategory.EnglishProductCategoryName AS Category,
+        SUM(factinternetsales.SalesAmount) AS Sales
+    FROM factinternetsales
+    JOIN dimproduct ON factinternetsales.ProductKey = dimproduct.ProductKey
+    JOIN dimproductsubcategory ON dimproduct.ProductSubcategoryKey = dimproductsubcategory.ProductSubcategoryKey
+    JOIN dimproductcategory ON dimproductsubcategory.ProductCategoryKey = dimproductcategory.ProductCategoryKey
+    WHERE factinternetsales.OrderDateKey BETWEEN %s AND %s
+    GROUP BY dimproductcategory.EnglishProductCategoryName
+    """
+    df_sales_by_category = read_sql("sales_by_category", query_sales_by_category, conn, params=key_range)
+    return df_sales_by_category
+
+def query_top_sales_by_country(conn, key_range):
+    query_top_sales_by_country = """
+    SELECT 
+        SalesTerritoryCountry,
+        SUM(SalesAmount) AS TotalSales
+    FROM factinternetsales
+    JOIN dimsalesterritory ON factinternetsales.SalesTerritoryKey = dimsalesterritory.SalesTerritoryKey
+    WHERE factinternetsales.OrderDateKey BETWEEN %s AND %s
+    GROUP BY SalesTerritoryCountry
+    ORDER BY TotalSales DESC
+    LIMIT 5
+    """
+    df_top_sales_by_country = read_sql("top_sales_by_country", query_top_sales_by_country, conn, params=key_range)
+    return short_country_names(df_top_sales_by_country)
+
+def query_overview_sql(conn, key_range, calendar):
+    return (
+        query_sales(conn, key_range),
+        query_sales_by_product_territory(conn, key_range),
+        query_sales_by_month(conn, key_range, calendar),
+        query_sales_by_category(conn, key_range),
+        query_top_sales_by_country(conn, key_range),
+    )
+
+def query_product_sales(conn):
+    query_product_sales = """
+    SELECT 
+        dimproduct.EnglishProductName AS Product,
+        SUM(factinternetsales.OrderQuantity) AS Orders,
+        SUM(factinternetsales.SalesAmount) AS Revenue,
+        SUM(factinternetsales.SalesAmount - factinternetsales.TotalProductCost) AS Profit
+    FROM factinternetsales
+    JOIN dimproduct ON factinternetsales.ProductKey = dimproduct.ProductKey
+    GROUP BY dimproduct.EnglishProductName
+    ORDER BY Revenue DESC
+    """
+    df_product_sales = read_sql("product_sales", query_product_sales, conn)
+    return df_product_sales
+
+def query_overview_extract(conn, key_range, calendar):
+    query_extract = """
+    SELECT
+        factinternetsales.OrderDateKey,
+        dimproduct.EnglishProductName AS Product,
+        dimproductcategory.EnglishProductCategoryName AS Category,
+        dimsalesterritory.SalesTerritoryCountry AS Territory,
+        factinternetsales.SalesAmount,
+        factinternetsales.OrderQuantity,
+        factinternetsales.TotalProductCost
+    FROM factinternetsales
+    LEFT JOIN dimproduct ON factinternetsales.ProductKey = dimproduct.ProductKey
+    LEFT JOIN dimproductsubcategory ON dimproduct.ProductSubcategoryKey = dimproductsubcategory.ProductSubcategoryKey
+    LEFT JOIN dimproductcategory ON dimproductsubcategory.ProductCategoryKey = dimproductcategory.ProductCategoryKey
+    LEFT JOIN dimsalesterritory ON factinternetsales.SalesTerritoryKey = dimsalesterritory.SalesTerritoryKey
+    WHERE factinternetsales.OrderDateKey BETWEEN %s AND %s
+    """
+    extract = read_sql("overview_extract", query_extract, conn, params=key_range, dtype={
+        'Product': 'category',
+        'Category': 'category',
+        'Territory': 'category',
+        'SalesAmount': 'float64',
+        'OrderQuantity': 'float64',
+        'TotalProductCost': 'float64',
+    })
+    extract['Month'] = calendar.months(extract.pop('OrderDateKey'))
+    return extract.dropna(subset=['Month']).astype({
+        'Month': 'int8',
+        'Product': 'category',
+        'Category': 'category',
+        'Territory': 'category',
+        'SalesAmount': 'float64',
+        'OrderQuantity': 'float64',
+        'TotalProductCost': 'float64',
+    })
+
+def aggregate_overview(extract):
+    # Groupbys drop rows with a missing dimension, matching the INNER JOINs in query_overview_sql
+    extract = extract.assign(Profit=extract['SalesAmount'] - extract['TotalProductCost'])
+
+    total_sales = extract['SalesAmount'].sum() if len(extract) else None
+    profit = extract['Profit'].sum() if len(extract) else None
+    df_sales = pd.DataFrame({
+        'TotalSales': [total_sales],
+        'TotalQuantity': [extract['OrderQuantity'].sum() if len(extract) else None],
+        'Profit': [profit],
+        'ProfitPercentage': [profit / total_sales * 100 if total_sales else None],
+    }, dtype='float64')
+
+    df_sales_by_month = (
+        extract.groupby('Month')[['SalesAmount', 'OrderQuantity']].sum()
+        .rename(columns={'SalesAmount': 'Sales', 'OrderQuantity': 'Quantity'})
+        .reset_index()
+        .astype({'Month': 'int64'})
+    )
+
+    df = (
+        extract.groupby(['Product', 'Territory'], observed=True)[['SalesAmount', 'Profit']].sum()
+        .rename(columns={'SalesAmount': 'TotalSales'})
+        .reset_index()
+        .astype({'Product': object, 'Territory': object})
+    )[['TotalSales', 'Profit', 'Product', 'Territory']]
+
+    df_sales_by_category = (
+        extract.groupby('Category', observed=True)['SalesAmount'].sum()
+        .rename('Sales')
+        .reset_index()
+        .astype({'Category': object})
+    )
+
+    df_top_sales_by_country = (
+        extract.groupby('Territory', observed=True)['SalesAmount'].sum()
+        .nlargest(5)
+        .rename('TotalSales')
+        .rename_axis('SalesTerritoryCountry')
+        .reset_index()
+        .astype({'SalesTerritoryCountry': object})
+        .pipe(short_country_names)
+    )
+
+    return df_sales, df, df_sales_by_month, df_sales_by_category, df_top_sales_by_country
+
+def load_cube():
+    if not get_setting("USE_CUBE", False):
+        return None
+    return rollup.read_cube(get_setting("CUBE_DIR", ".cube"), max_age=float(get_setting("CUBE_MAX_AGE", 86400)))
+
+def overview_source(date_range):
+    # The cube is only month-grained, so date ranges always go to the database
+    if date_range is None and load_cube() is not None:
+        return "cube"
+    return get_setting("OVERVIEW_MODE", "sql")
+
+def overview_aggregated(params):
+    return overview_source(params['date_range']) != "sql"
+
+def overview_from_cube(params):
+    return overview_source(params['date_range']) == "cube"
+
+def cube_available(params):
+    return load_cube() is not None
+
+def cube_matches_as_of(params):
+    # A cube banded ages as of another date would give different age groups than the live path
+    cube = load_cube()
+    return cube is not None and cube.meta['as_of'] == params['as_of'].isoformat()
+
+@dataset("calendar", cached=False)
+def load_calendar():
+    return get_calendar_index()
+
+@dataset("key_range", params=('year', 'date_range'), depends=('calendar',), cached=False)
+def load_key_range(year, date_range, calendar):
+    return calendar.range_bounds(*date_range) if date_range else calendar.year_bounds(year)
+
+# The cube variant is registered first and has no dependencies, so a fresh cube is
+# served even when the database can't be reached for the calendar
+@dataset("overview_aggregates", params=('year', 'date_range'), cached=False, when=overview_from_cube)
+def load_overview_aggregates_from_cube(year, date_range):
+    cube = load_cube()
+    return None if cube is None else aggregate_overview(rollup.year_rows(cube, year))
+
+@dataset("overview_aggregates", params=('year', 'date_range'), depends=('calendar', 'key_range'), cached=False)
+def load_overview_aggregates(year, date_range, calendar, key_range):
+    extract = run_query(query_overview_extract, key_range=key_range, calendar=calendar)
+    return None if extract is None else aggregate_overview(extract)
+
+OVERVIEW_FRAMES = ['sales', 'sales_by_product_territory', 'sales_by_month', 'sales_by_category', 'top_sales_by_country']
+
+dataset_parts(OVERVIEW_FRAMES, 'overview_aggregates', params=('year', 'date_range'), when=overview_aggregated)
+
+@dataset("sales", params=('year', 'date_range'), depends=('key_range',))
+def load_sales(year, date_range, key_range):
+    return run_query(query_sales, key_range=key_range)
+
+@dataset("sales_by_product_territory", params=('year', 'date_range'), depends=('key_range',))
+def load_sales_by_product_territory(year, date_range, key_range):
+    return run_query(query_sales_by_product_territory, key_range=key_range)
+
+@dataset("sales_by_month", params=('year', 'date_range'), depends=('key_range', 'calendar'))
+def load_sales_by_month(year, date_range, key_range, calendar):
+    return run_query(query_sales_by_month, key_range=key_range, calendar=calendar)
+
+@dataset("sales_by_category", params=('year', 'date_range'), depends=('key_range',))
+def load_sales_by_category(year, date_range, key_range):
+    return run_query(query_sales_by_category, key_range=key_range)
+
+@dataset("top_sales_by_country", params=('year', 'date_range'), depends=('key_range',))
+def load_top_sales_by_country(year, date_range, key_range):
+    return run_query(query_top_sales_by_country, key_range=key_range)
+
+@dataset("product_sales", when=cube_available)
+def load_product_sales_from_cube():
+    cube = load_cube()
+    return None if cube is None else rollup.aggregate_product_sales(cube.facts)
+
+@dataset("product_sales")
+def load_product_sales():
+    return run_query(query_product_sales)
+
+def age_as_of():
+    as_of = get_setting("AGE_AS_OF")
+    return datetime.date.fromisoformat(as_of) if as_of else datetime.date.today()
+
+AGE_GROUPS = ['< 30 Years', '30 - 39 Years', '40 - 49 Years', '50 - 59 Years', '60 - 69 Years', '> 70 Years']
+
+def age_groups(birth_dates, as_of):
+    # Same whole-year arithmetic as TIMESTAMPDIFF(YEAR, BirthDate, as_of)
+    birthday_pending = (birth_dates.dt.month > as_of.month) | ((birth_dates.dt.month == as_of.month) & (birth_dates.dt.day > as_of.day))
+    age = as_of.year - birth_dates.dt.year - birthday_pending.astype(int)
+    groups = pd.cut(age, bins=[-np.inf, 29, 39, 49, 59, 69, np.inf], labels=AGE_GROUPS)
+    # Missing birth dates land in the last band, like the ELSE branch of the old CASE
+    return groups.fillna(AGE_GROUPS[-1])
+
+class CustomerAttributes:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._customers = None
+        self._max_key = -1
+        self._as_of = None
+
+    def refresh(self, conn, as_of):
+        with self._lock:
+            query_customers = """
+            SELECT CustomerKey, Gender, EnglishOccupation AS Occupation, BirthDate
+            FROM dimcustomer
+            WHERE CustomerKey > %s
+            """
+            new_customers = read_sql("customer_attributes", query_customers, conn, params=(self._max_key,), index_col='CustomerKey')
+            new_customers['BirthDate'] = pd.to_datetime(new_customers['BirthDate'])
+
+            if self._customers is None or len(new_customers):
+                customers = new_customers
+                if self._customers is not None:
+                    customers = pd.concat([self._customers.drop(columns='AgeGroup').astype({'Gender': object, 'Occupation': object}), new_customers])
+                customers = customers.astype({'Gender': 'category', 'Occupation': 'category'})
+                self._customers = customers.assign(AgeGroup=age_groups(customers['BirthDate'], as_of))
+                self._max_key = int(customers.index.max()) if len(customers) else -1
+                self._as_of = as_of
+            elif as_of != self._as_of:
+                self._customers = self._customers.assign(AgeGroup=age_groups(self._customers['BirthDate'], as_of))
+                self._as_of = as_of
+            return self._customers
+
+@st.cache_resource(max_entries=1)
+def get_customer_attributes(generation=None):
+    return CustomerAttributes()
+
+def query_average_revenue(conn):
+    query_average_revenue = """
+    SELECT AVG(SalesAmount) AS AverageRevenuePerCustomer
+    FROM factinternetsales
+    """
+    df_average_revenue = read_sql("average_revenue", query_average_revenue, conn)
+    return df_average_revenue
+
+def query_profit_by_customer_day(conn):
+    query_profit_by_customer_day = """
+    SELECT CustomerKey, OrderDateKey, SUM(SalesAmount - TotalProductCost) AS Profit
+    FROM factinternetsales
+    GROUP BY CustomerKey, OrderDateKey
+    """
+    df_profit_by_customer_day = read_sql("profit_by_customer_day", query_profit_by_customer_day, conn)
+    return df_profit_by_customer_day
+
+def aggregate_customer_profit(df_profit_by_customer_day, customers, calendar):
+    attributes = customers.reindex(df_profit_by_customer_day['CustomerKey'])
+    profit = df_profit_by_customer_day.assign(
+        Month=calendar.months(df_profit_by_customer_day['OrderDateKey']),
+        Gender=attributes['Gender'].array,
+        Occupation=attributes['Occupation'].array,
+        AgeGroup=attributes['AgeGroup'].array,
+    )
+
+    df_profit_trend_by_gender = (
+        profit.groupby(['Month', 'Gender'], observed=True)['Profit'].sum()
+        .reset_index()
+        .astype({'Month': 'int64', 'Gender': object})
+    )
+    df_profit_by_age_group = (
+        profit.groupby('AgeGroup', observed=True)['Profit'].sum()
+        .reset_index()
+        .astype({'AgeGroup': object})
+    )
+    df_profit_by_profession = (
+        profit.groupby('Occupation', observed=True)['Profit'].sum()
+        .rename_axis('Profession')
+        .reset_index()
+        .astype({'Profession': object})
+    )
+    return df_profit_trend_by_gender, df_profit_by_age_group, df_profit_by_profession
+
+@dataset("customer_aggregates", cached=False)
+def load_customer_aggregates():
+    cube = load_cube()
+    return None if cube is None else rollup.aggregate_customer(cube)
+
+CUSTOMER_FRAMES = ['total_customers', 'average_revenue', 'gender_distribution', 'profit_trend_by_gender', 'profit_by_age_group', 'profit_by_profession']
+
+dataset_parts(CUSTOMER_FRAMES, 'customer_aggregates', params=('as_of',), when=cube_matches_as_of)
+
+@dataset("customer_attributes", params=('as_of',), cached=False)
+def load_customer_attributes(as_of):
+    return run_query(get_customer_attributes(dimension_generation()).refresh, as_of=as_of)
+
+@dataset("profit_by_customer_day", cached=False)
+def load_profit_by_customer_day():
+    return run_query(query_profit_by_customer_day)
+
+@dataset("customer_profit", params=('as_of',), depends=('profit_by_customer_day', 'customer_attributes', 'calendar'), cached=False)
+def load_customer_profit(as_of, profit_by_customer_day, customer_attributes, calendar):
+    return aggregate_customer_profit(profit_by_customer_day, customer_attributes, calendar)
+
+@dataset("total_customers", params=('as_of',), depends=('customer_attributes',))
+def load_total_customers(as_of, customer_attributes):
+    return pd.DataFrame({'TotalCustomers': [len(customer_attributes)]})
+
+@dataset("average_revenue", params=('as_of',))
+def load_average_revenue(as_of):
+    return run_query(query_average_revenue)
+
+@dataset("gender_distribution", params=('as_of',), depends=('customer_attributes',))
+def load_gender_distribution(as_of, customer_attributes):
+    return (
+        customer_attributes['Gender'].value_counts(dropna=False, sort=False)
+        .rename_axis('Gender')
+        .reset_index(name='Count')
+        .astype({'Gender': object})
+    )
+
+dataset_parts(CUSTOMER_FRAMES[3:], 'customer_profit', params=('as_of',))
+
+def query_years(conn):
+    query_years = """
+    SELECT DISTINCT CalendarYear
+    FROM dimtime
+    WHERE
+    CalendarYear BETWEEN 2001 AND 2004
+    """
+    df_years = read_sql("years", query_years, conn)
+    years = df_years['CalendarYear'].tolist()
+    years = sorted(years, reverse=True) 
+    return years
+
+@dataset("years")
+def load_year_list():
+    return run_query(query_years)
+
+def load_years():
+    return DatasetContext().get("years") or []
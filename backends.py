@@ -0,0 +1,92 @@
+import sqlite3
+
+import pandas as pd
+
+import columnar
+
+TABLES = ['factinternetsales', 'dimtime', 'dimproduct', 'dimproductsubcategory', 'dimproductcategory', 'dimsalesterritory', 'dimcustomer']
+
+BACKENDS = {}
+
+def register_backend(name):
+    def decorator(cls):
+        BACKENDS[name] = cls
+        return cls
+    return decorator
+
+def frame_options(df, index_col=None, dtype=None):
+    if dtype:
+        df = df.astype(dtype)
+    return df.set_index(index_col) if index_col else df
+
+@register_backend('mysql')
+class MySQLBackend:
+    def __init__(self, host, port, user, password, database, fetch_mode='columnar'):
+        self.options = {'host': host, 'port': port, 'user': user, 'password': password, 'database': database}
+        self.fetch_mode = fetch_mode
+
+    @property
+    def errors(self):
+        # Imported lazily so deployments on an embedded snapshot don't need the MySQL driver
+        import mysql.connector
+        return (mysql.connector.Error,)
+
+    def connect(self):
+        import mysql.connector
+        return mysql.connector.connect(**self.options)
+
+    def read(self, conn, query, params=None, **kwargs):
+        if self.fetch_mode == 'columnar':
+            return columnar.fetch_frame(conn, query, params, **kwargs)
+        return pd.read_sql(query, conn, params=params, **kwargs)
+
+    def reset(self, conn):
+        # End the implicit transaction so the next borrower doesn't read a stale snapshot
+        conn.rollback()
+
+    def is_alive(self, conn):
+        return conn.is_connected()
+
+@register_backend('duckdb')
+class DuckDBBackend:
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def errors(self):
+        import duckdb
+        return (duckdb.Error,)
+
+    def connect(self):
+        import duckdb
+        return duckdb.connect(self.path, read_only=True)
+
+    def read(self, conn, query, params=None, **kwargs):
+        # DuckDB hands back columnar results directly, DECIMAL sums included as float64
+        df = conn.execute(query.replace('%s', '?'), list(params or ())).df()
+        return frame_options(df, **kwargs)
+
+    def reset(self, conn):
+        pass
+
+    def is_alive(self, conn):
+        return True
+
+@register_backend('sqlite')
+class SQLiteBackend:
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+
+    def read(self, conn, query, params=None, **kwargs):
+        return pd.read_sql(query.replace('%s', '?'), conn, params=tuple(params or ()), **kwargs)
+
+    def reset(self, conn):
+        conn.rollback()
+
+    def is_alive(self, conn):
+        return True
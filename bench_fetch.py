@@ -0,0 +1,91 @@
+import argparse
+import functools
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+from awdata import (create_connection, load_backend, load_calendar_index, query_sales, query_sales_by_month, query_sales_by_product_territory,
+                    query_sales_by_category, query_top_sales_by_country, query_overview_extract, query_profit_by_customer_day)
+
+MODES = ['pandas', 'columnar']
+
+def fact_queries(key_range, calendar):
+    return {
+        'sales': (functools.partial(query_sales, key_range=key_range), []),
+        'sales_by_month': (functools.partial(query_sales_by_month, key_range=key_range, calendar=calendar), ['Month']),
+        'sales_by_product_territory': (functools.partial(query_sales_by_product_territory, key_range=key_range), ['Product', 'Territory']),
+        'sales_by_category': (functools.partial(query_sales_by_category, key_range=key_range), ['Category']),
+        'top_sales_by_country': (functools.partial(query_top_sales_by_country, key_range=key_range), []),
+        'overview_extract': (functools.partial(query_overview_extract, key_range=key_range, calendar=calendar), None),
+        'profit_by_customer_day': (query_profit_by_customer_day, ['CustomerKey', 'OrderDateKey']),
+    }
+
+def run_mode(mode, query, conn, repeat):
+    # The backend is cached, so it is rebuilt to pick up the new FETCH_MODE
+    os.environ['AWDASH_FETCH_MODE'] = f'"{mode}"'
+    load_backend.clear()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = query(conn)
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+def normalize(df, keys):
+    if keys is None:
+        # Row order of the extract isn't defined, so compare it by sorted rows
+        keys = list(df.columns)
+    df = df.astype({column: object for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+    df = df.apply(lambda column: column if column.name in keys and column.dtype == object else pd.to_numeric(column))
+    if keys:
+        df = df.sort_values(keys)
+    return df.reset_index(drop=True)
+
+def compare(expected, actual, keys):
+    try:
+        pd.testing.assert_frame_equal(normalize(expected, keys), normalize(actual, keys), check_dtype=False, rtol=1e-9)
+    except AssertionError as err:
+        return str(err)
+    return None
+
+def memory(df):
+    return df.memory_usage(index=True, deep=True).sum() / 2**20
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pd.read_sql with the columnar prepared-statement fetch path")
+    parser.add_argument('--year', type=int, default=2003)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    conn = create_connection()
+    if conn is None:
+        sys.exit("Could not connect to the database")
+
+    calendar = load_calendar_index()
+    failed = False
+    try:
+        print(f"{'query':<28} {'pandas p50':>11} {'columnar p50':>13} {'speedup':>8} {'pandas MB':>10} {'columnar MB':>12}  frames")
+        for name, (query, keys) in fact_queries(calendar.year_bounds(args.year), calendar).items():
+            results = {}
+            for mode in MODES:
+                result, timings = run_mode(mode, query, conn, args.repeat)
+                results[mode] = (result, statistics.median(timings) * 1000)
+
+            (expected, pandas_p50), (actual, columnar_p50) = results['pandas'], results['columnar']
+            mismatch = compare(expected, actual, keys)
+            failed = failed or mismatch is not None
+            print(f"{name:<28} {pandas_p50:>9.1f}ms {columnar_p50:>11.1f}ms {pandas_p50 / columnar_p50:>7.2f}x "
+                  f"{memory(expected):>10.2f} {memory(actual):>12.2f}  {'match' if mismatch is None else 'MISMATCH'}")
+            if mismatch is not None:
+                print(f"       {mismatch}")
+    finally:
+        conn.close()
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+from awdata import create_connection, load_calendar_index, query_overview_sql, query_overview_extract, aggregate_overview
+
+FRAMES = [
+    ('df_sales', []),
+    ('df', ['Product', 'Territory']),
+    ('df_sales_by_month', ['Month']),
+    ('df_sales_by_category', ['Category']),
+    ('df_top_sales_by_country', []),
+]
+
+def time_call(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+def normalize(df, keys):
+    df = df.apply(lambda column: column if column.name in keys else pd.to_numeric(column))
+    if keys:
+        df = df.sort_values(keys)
+    return df.reset_index(drop=True)
+
+def compare_frames(sql_frames, extract_frames):
+    mismatches = []
+    for (name, keys), expected, actual in zip(FRAMES, sql_frames, extract_frames):
+        try:
+            pd.testing.assert_frame_equal(normalize(expected, keys), normalize(actual, keys), check_dtype=False, rtol=1e-9)
+        except AssertionError as err:
+            mismatches.append(f"{name}: {err}")
+    return mismatches
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return statistics.median(ordered) * 1000, ordered[int(len(ordered) * 0.95)] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-query and single-scan Sales Overview paths")
+    parser.add_argument('--years', type=int, nargs='+', default=[2001, 2002, 2003, 2004])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    conn = create_connection()
+    if conn is None:
+        sys.exit("Could not connect to the database")
+
+    calendar = load_calendar_index()
+    failed = False
+    try:
+        print(f"{'year':>6} {'sql p50':>10} {'sql p95':>10} {'scan p50':>10} {'agg p50':>10} {'speedup':>8}  frames")
+        for year in args.years:
+            key_range = calendar.year_bounds(year)
+            sql_frames, sql_timings = time_call(lambda: query_overview_sql(conn, key_range, calendar), args.repeat)
+            extract, scan_timings = time_call(lambda: query_overview_extract(conn, key_range, calendar), args.repeat)
+            extract_frames, agg_timings = time_call(lambda: aggregate_overview(extract), args.repeat)
+
+            sql_p50, sql_p95 = summarize(sql_timings)
+            scan_p50, _ = summarize(scan_timings)
+            agg_p50, _ = summarize(agg_timings)
+            mismatches = compare_frames(sql_frames, extract_frames)
+            failed = failed or bool(mismatches)
+
+            print(f"{year:>6} {sql_p50:>8.1f}ms {sql_p95:>8.1f}ms {scan_p50:>8.1f}ms {agg_p50:>8.1f}ms "
+                  f"{sql_p50 / (scan_p50 + agg_p50):>7.2f}x  {'match' if not mismatches else 'MISMATCH'}")
+            for mismatch in mismatches:
+                print(f"       {mismatch}")
+    finally:
+        conn.close()
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import mysql.connector
+import numpy as np
+import pandas as pd
+
+BASE_CUSTOMERS = 18484
+BASE_PRODUCTS = 606
+BASE_FACT_ROWS = 60398
+FIRST_DATE = '2001-07-01'
+LAST_DATE = '2004-07-31'
+
+CATEGORIES = ['Bikes', 'Components', 'Clothing', 'Accessories']
+COUNTRIES = [
+    'United States', 'United States', 'United States', 'United States', 'United States',
+    'Canada', 'France', 'Germany', 'Australia', 'United Kingdom', 'NA',
+]
+OCCUPATIONS = ['Professional', 'Skilled Manual', 'Management', 'Clerical', 'Manual']
+
+SCHEMA = {
+    'dimtime': """
+        CREATE TABLE dimtime (
+            TimeKey INT PRIMARY KEY,
+            FullDateAlternateKey DATETIME NOT NULL,
+            CalendarYear SMALLINT NOT NULL
+        )
+    """,
+    'dimproductcategory': """
+        CREATE TABLE dimproductcategory (
+            ProductCategoryKey INT PRIMARY KEY,
+            EnglishProductCategoryName VARCHAR(50) NOT NULL
+        )
+    """,
+    'dimproductsubcategory': """
+        CREATE TABLE dimproductsubcategory (
+            ProductSubcategoryKey INT PRIMARY KEY,
+            ProductCategoryKey INT NOT NULL
+        )
+    """,
+    'dimproduct': """
+        CREATE TABLE dimproduct (
+            ProductKey INT PRIMARY KEY,
+            EnglishProductName VARCHAR(50) NOT NULL,
+            ProductSubcategoryKey INT NULL
+        )
+    """,
+    'dimsalesterritory': """
+        CREATE TABLE dimsalesterritory (
+            SalesTerritoryKey INT PRIMARY KEY,
+            SalesTerritoryCountry VARCHAR(50) NOT NULL
+        )
+    """,
+    'dimcustomer': """
+        CREATE TABLE dimcustomer (
+            CustomerKey INT PRIMARY KEY,
+            Gender CHAR(1) NULL,
+            EnglishOccupation VARCHAR(100) NULL,
+            BirthDate DATE NULL
+        )
+    """,
+    'factinternetsales': """
+        CREATE TABLE factinternetsales (
+            ProductKey INT NOT NULL,
+            OrderDateKey INT NOT NULL,
+            CustomerKey INT NOT NULL,
+            SalesTerritoryKey INT NOT NULL,
+            OrderQuantity SMALLINT NOT NULL,
+            SalesAmount DECIMAL(19, 4) NOT NULL,
+            TotalProductCost DECIMAL(19, 4) NOT NULL,
+            KEY ix_orderdate (OrderDateKey),
+            KEY ix_customer (CustomerKey),
+            KEY ix_product (ProductKey)
+        )
+    """,
+}
+
+def generate(scale, seed=0):
+    rng = np.random.default_rng(seed)
+
+    dates = pd.date_range(FIRST_DATE, LAST_DATE, freq='D')
+    dimtime = pd.DataFrame({
+        'TimeKey': np.arange(1, len(dates) + 1),
+        'FullDateAlternateKey': dates,
+        'CalendarYear': dates.year,
+    })
+
+    dimproductcategory = pd.DataFrame({
+        'ProductCategoryKey': np.arange(1, len(CATEGORIES) + 1),
+        'EnglishProductCategoryName': CATEGORIES,
+    })
+    dimproductsubcategory = pd.DataFrame({
+        'ProductSubcategoryKey': np.arange(1, 38),
+        'ProductCategoryKey': rng.integers(1, len(CATEGORIES) + 1, 37),
+    })
+
+    product_count = BASE_PRODUCTS * scale
+    subcategories = rng.integers(1, 38, product_count).astype(object)
+    # Roughly a third of AdventureWorks products have no subcategory
+    subcategories[rng.random(product_count) < 0.35] = None
+    dimproduct = pd.DataFrame({
+        'ProductKey': np.arange(1, product_count + 1),
+        'EnglishProductName': [f"Product {key:06d}" for key in range(1, product_count + 1)],
+        'ProductSubcategoryKey': subcategories,
+    })
+    list_prices = rng.lognormal(mean=4.5, sigma=1.4, size=product_count).round(4)
+
+    dimsalesterritory = pd.DataFrame({
+        'SalesTerritoryKey': np.arange(1, len(COUNTRIES) + 1),
+        'SalesTerritoryCountry': COUNTRIES,
+    })
+
+    customer_count = BASE_CUSTOMERS * scale
+    birth_offsets = rng.integers(0, 365 * 70, customer_count)
+    dimcustomer = pd.DataFrame({
+        'CustomerKey': np.arange(1, customer_count + 1),
+        'Gender': rng.choice(['M', 'F'], customer_count),
+        'EnglishOccupation': rng.choice(OCCUPATIONS, customer_count),
+        'BirthDate': pd.Timestamp('1910-01-01') + pd.to_timedelta(birth_offsets, unit='D'),
+    })
+
+    fact_rows = BASE_FACT_ROWS * scale
+    # Sales ramp up over the period, as they do in the real data
+    weights = np.linspace(0.2, 1.0, len(dates)) ** 2
+    order_dates = np.sort(rng.choice(dimtime['TimeKey'].to_numpy(), fact_rows, p=weights / weights.sum()))
+    products = rng.integers(1, product_count + 1, fact_rows)
+    quantity = np.ones(fact_rows, dtype=np.int64)
+    sales = list_prices[products - 1] * quantity
+    factinternetsales = pd.DataFrame({
+        'ProductKey': products,
+        'OrderDateKey': order_dates,
+        'CustomerKey': rng.integers(1, customer_count + 1, fact_rows),
+        'SalesTerritoryKey': rng.choice(dimsalesterritory['SalesTerritoryKey'].to_numpy(), fact_rows),
+        'OrderQuantity': quantity,
+        'SalesAmount': sales.round(4),
+        'TotalProductCost': (sales * rng.uniform(0.55, 0.65, fact_rows)).round(4),
+    })
+
+    return {
+        'dimtime': dimtime,
+        'dimproductcategory': dimproductcategory,
+        'dimproductsubcategory': dimproductsubcategory,
+        'dimproduct': dimproduct,
+        'dimsalesterritory': dimsalesterritory,
+        'dimcustomer': dimcustomer,
+        'factinternetsales': factinternetsales,
+    }
+
+def database_name(scale):
+    return f"awbench_sf{scale}"
+
+def connect(args, database=None):
+    return mysql.connector.connect(host=args.host, port=args.port, user=args.user, password=args.password, database=database)
+
+def rows_of(frame):
+    frame = frame.astype(object).where(frame.notna(), None)
+    for row in frame.itertuples(index=False, name=None):
+        yield tuple(value.item() if isinstance(value, np.generic) else value for value in row)
+
+def load(conn, tables, batch_size):
+    cursor = conn.cursor()
+    for name, frame in tables.items():
+        cursor.execute(f"DROP TABLE IF EXISTS {name}")
+        cursor.execute(SCHEMA[name])
+        insert = f"INSERT INTO {name} ({', '.join(frame.columns)}) VALUES ({', '.join(['%s'] * len(frame.columns))})"
+        batch = []
+        for row in rows_of(frame):
+            batch.append(row)
+            if len(batch) == batch_size:
+                cursor.executemany(insert, batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert, batch)
+        conn.commit()
+        print(f"  {name}: {len(frame)} rows")
+    cursor.close()
+
+def command_generate(args):
+    for scale in args.scale:
+        database = database_name(scale)
+        print(f"Generating scale factor {scale}x into {database}")
+        conn = connect(args)
+        conn.cursor().execute(f"CREATE DATABASE IF NOT EXISTS {database}")
+        conn.close()
+
+        conn = connect(args, database)
+        try:
+            load(conn, generate(scale, args.seed), args.batch_size)
+        finally:
+            conn.close()
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def summarize(timings, peak_bytes):
+    return {
+        'first_ms': round(timings[0] * 1000, 2),
+        'p50_ms': round(percentile(timings[1:] or timings, 50) * 1000, 2),
+        'p95_ms': round(percentile(timings[1:] or timings, 95) * 1000, 2),
+        'p99_ms': round(percentile(timings[1:] or timings, 99) * 1000, 2),
+        'peak_mb': round(peak_bytes / 2**20, 2),
+    }
+
+def point_app_at(args, scale):
+    # Values are JSON so a numeric-looking password still reaches the app as a string
+    settings = {
+        'DB_HOST': args.host,
+        'DB_PORT': args.port,
+        'DB_USER': args.user,
+        'DB_PASSWORD': args.password,
+        'DB_DATABASE': database_name(scale),
+        'USE_CUBE': False,
+    }
+    for name, value in settings.items():
+        os.environ[f"AWDASH_{name}"] = json.dumps(value)
+
+def benchmark_targets():
+    # Imported here so the environment overrides above are in place first
+    import streamlit as st
+
+    import awdata
+    import charts
+
+    # Drop the pool and process-wide indexes left over from the previous scale factor
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+    years = awdata.load_years()
+    overview_charts = {
+        'sales_by_month_chart': (charts.sales_by_month_chart, 'sales_by_month'),
+        'top_sales_by_country_chart': (charts.top_sales_by_country_chart, 'top_sales_by_country'),
+        'sales_by_category_chart': (charts.sales_by_category_chart, 'sales_by_category'),
+        'sales_profit_scatter': (charts.sales_profit_scatter, 'sales_by_product_territory'),
+    }
+    customer_charts = {
+        'profit_trend_by_gender_chart': (charts.profit_trend_by_gender_chart, 'profit_trend_by_gender'),
+        'profit_by_age_chart': (charts.profit_by_age_chart, 'profit_by_age_group'),
+        'profit_by_profession_chart': (charts.profit_by_profession_chart, 'profit_by_profession'),
+    }
+    # The datasets each page actually renders: its KPI frames plus one per chart
+    overview_names = ['sales'] + [name for _, name in overview_charts.values()]
+    customer_names = ['total_customers', 'average_revenue', 'gender_distribution'] + [name for _, name in customer_charts.values()]
+
+    def load_page(names, **params):
+        # Fanned out the way the dashboard loads a page
+        futures = awdata.DatasetContext(**params).prefetch(*names)
+        return {futures[future]: future.result() for future in futures}
+
+    targets = {'load_years': awdata.load_years}
+    for year in years:
+        targets[f"overview_datasets({year})"] = lambda year=year: load_page(overview_names, year=year, date_range=None)
+    targets['customer_datasets'] = lambda: load_page(customer_names, as_of=awdata.age_as_of())
+
+    overview = load_page(overview_names, year=years[0], date_range=None)
+    customer = load_page(customer_names, as_of=awdata.age_as_of())
+    charts_to_build = {name: (build, overview[dataset]) for name, (build, dataset) in overview_charts.items()}
+    charts_to_build.update({name: (build, customer[dataset]) for name, (build, dataset) in customer_charts.items()})
+    for name, (build, frame) in charts_to_build.items():
+        # to_json is what st.plotly_chart pays to ship the figure to the browser
+        targets[name] = lambda build=build, frame=frame: build(frame).to_json()
+    scatter_frame = overview['sales_by_product_territory']
+    targets['sales_profit_scatter(binned)'] = lambda: charts.sales_profit_scatter(scatter_frame, max_points=2000).to_json()
+
+    def reset():
+        # Every iteration starts from what refresh_data leaves behind, like the first visitor after a refresh
+        awdata.get_result_cache().clear()
+        awdata.load_calendar_index.clear()
+        awdata.get_customer_attributes.clear()
+
+    return targets, reset
+
+def run_target(func, reset, repeat):
+    timings = []
+    for _ in range(repeat):
+        reset()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    reset()
+    tracemalloc.start()
+    func()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summarize(timings, peak_bytes)
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for scale, targets in results.items():
+        for name, stats in targets.items():
+            previous = baseline.get(scale, {}).get(name)
+            if previous is None:
+                continue
+            for metric in ('p50_ms', 'peak_mb'):
+                if previous[metric] and stats[metric] > previous[metric] * (1 + threshold):
+                    regressions.append(f"sf{scale} {name} {metric}: {previous[metric]} -> {stats[metric]}")
+    return regressions
+
+def command_run(args):
+    results = {}
+    for scale in args.scale:
+        point_app_at(args, scale)
+        targets, reset = benchmark_targets()
+        print(f"Scale factor {scale}x")
+        print(f"  {'target':<32} {'first':>10} {'p50':>10} {'p95':>10} {'p99':>10} {'peak':>10}")
+        results[str(scale)] = {}
+        for name, func in targets.items():
+            stats = run_target(func, reset, args.repeat)
+            results[str(scale)][name] = stats
+            print(f"  {name:<32} {stats['first_ms']:>8.1f}ms {stats['p50_ms']:>8.1f}ms {stats['p95_ms']:>8.1f}ms "
+                  f"{stats['p99_ms']:>8.1f}ms {stats['peak_mb']:>8.1f}MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic AdventureWorks benchmarks for the dashboard loaders and charts")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--scale', type=int, nargs='+', default=[1], choices=[1, 10, 100])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help="create and load the synthetic star schema")
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--batch-size', type=int, default=5000)
+    generate_parser.set_defaults(func=command_generate)
+
+    run_parser = subparsers.add_parser('run', help="time the loaders and charts")
+    run_parser.add_argument('--repeat', type=int, default=10)
+    run_parser.add_argument('--output', help="write results as JSON")
+    run_parser.add_argument('--baseline', help="JSON from an earlier --output to compare against")
+    run_parser.add_argument('--threshold', type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    run_parser.set_defaults(func=command_run)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
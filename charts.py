@@ -0,0 +1,87 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import plotly.express as px
+
+COLOR_PALETTE = ['#003f5c', '#58508d', '#bc5090', '#ff6361', '#ffa600']
+
+FIGURE_CACHE_ENTRIES = 64
+
+_figures = OrderedDict()
+_lock = threading.Lock()
+
+def frame_digest(frame):
+    digest = hashlib.sha256(repr([(column, str(dtype)) for column, dtype in frame.dtypes.items()]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def memoized_figure(build, frame, **options):
+    # Reruns that feed a chart the same frame get the already-built figure back
+    key = (build.__name__, frame_digest(frame), tuple(sorted(options.items())))
+    with _lock:
+        if key in _figures:
+            _figures.move_to_end(key)
+            return True, _figures[key]
+    fig = build(frame, **options)
+    with _lock:
+        _figures[key] = fig
+        while len(_figures) > FIGURE_CACHE_ENTRIES:
+            _figures.popitem(last=False)
+    return False, fig
+
+def bin_points(df, x, y, by, bins):
+    # One marker per grid cell and colour, sized by how many points it stands for
+    cells = [df[by], pd.cut(df[x], bins, labels=False).rename('XCell'), pd.cut(df[y], bins, labels=False).rename('YCell')]
+    return (
+        df.groupby(cells, observed=True)
+        .agg(**{x: (x, 'mean'), y: (y, 'mean'), 'Products': (x, 'size')})
+        .reset_index()
+        .drop(columns=['XCell', 'YCell'])
+    )
+
+def sales_by_month_chart(df_sales_by_month):
+    return px.line(df_sales_by_month, x='Month', y='Sales', title='Sales by Month', markers=True, color_discrete_sequence=['#003f5c'])
+
+def top_sales_by_country_chart(df_top_sales_by_country):
+    fig_top_sales_country = px.bar(
+            df_top_sales_by_country, 
+            x='SalesTerritoryCountry', 
+            y='TotalSales', 
+            title='Top 5 Sales by Country', 
+            color_discrete_sequence=['#ffa600'],
+        )
+    fig_top_sales_country.update_layout(xaxis={'tickangle': 0})
+    return fig_top_sales_country
+
+def sales_by_category_chart(df_sales_by_category):
+    return px.pie(df_sales_by_category, names='Category', values='Sales', title='Sales by Category', color_discrete_sequence=['#003f5c','#665191','#a05195'])
+
+def sales_profit_scatter(df, webgl_threshold=1000, max_points=None):
+    # Dense catalogs are binned server-side when max_points is set, and anything still
+    # above webgl_threshold is drawn with WebGL instead of one SVG node per point
+    if max_points and len(df) > max_points:
+        df = bin_points(df, 'TotalSales', 'Profit', 'Territory', bins=max(int((max_points / max(df['Territory'].nunique(), 1)) ** 0.5), 1))
+        extra = {'size': 'Products', 'hover_data': ['Products']}
+    else:
+        extra = {'hover_data': ['Product']}
+    return px.scatter(
+        df,
+        x='TotalSales',
+        y='Profit',
+        color='Territory',
+        title='Sales vs. Profit Analysis',
+        render_mode='webgl' if len(df) > webgl_threshold else 'svg',
+        **extra
+    )
+
+def profit_trend_by_gender_chart(df_profit_trend_by_gender):
+    return px.line(df_profit_trend_by_gender, x='Month', y='Profit', title='Profit Trend by Gender', color='Gender', 
+                   color_discrete_sequence=['#1f77b4', '#bc5090'])
+
+def profit_by_age_chart(df_profit_by_age_group):
+    return px.bar(df_profit_by_age_group, x='AgeGroup', y='Profit', title='Profit by Age', text='Profit', color='AgeGroup', color_discrete_sequence=COLOR_PALETTE)
+
+def profit_by_profession_chart(df_profit_by_profession):
+    return px.bar(df_profit_by_profession, x='Profit', y='Profession', title='Profit by Customer Profession', color='Profession', color_discrete_sequence=COLOR_PALETTE)
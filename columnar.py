@@ -0,0 +1,80 @@
+import decimal
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+_statements = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+def prepared_cursor(conn, query):
+    # Prepared cursors are kept per pooled connection, so a query that runs again on the
+    # same connection reuses its server-side statement instead of being parsed again
+    with _lock:
+        cursors = _statements.setdefault(conn, {})
+        cursor = cursors.get(query)
+        if cursor is None:
+            cursor = cursors[query] = conn.cursor(prepared=True)
+    return cursor
+
+def forget_cursor(conn, query):
+    with _lock:
+        cursor = _statements.get(conn, {}).pop(query, None)
+    if cursor is not None:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+def column_array(values, dtype=None):
+    # One NumPy call per column per batch; DECIMAL sums arrive as Decimal objects and
+    # are converted by NumPy's float coercion rather than row by row in Python
+    if dtype is None or dtype == 'category' or dtype == object:
+        return np.array([value.decode() if isinstance(value, (bytes, bytearray)) else value for value in values], dtype=object)
+    if np.dtype(dtype).kind in 'iu':
+        try:
+            return np.array(values, dtype=dtype)
+        except TypeError:
+            # NULLs in an integer column; the column comes back as float64 with NaN
+            return np.array(values, dtype='float64')
+    return np.array(values, dtype=dtype)
+
+def infer_dtype(values):
+    # Numbers get typed arrays; strings and dates stay object columns, as pd.read_sql leaves them
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, int):
+            return 'int64'
+        if isinstance(value, (float, decimal.Decimal)):
+            return 'float64'
+        return None
+    return None
+
+def fetch_frame(conn, query, params=None, index_col=None, dtype=None, batch_size=10000):
+    dtype = dict(dtype or {})
+    cursor = prepared_cursor(conn, query)
+    try:
+        cursor.execute(query, tuple(params or ()))
+        columns = [description[0] for description in cursor.description]
+        chunks = {column: [] for column in columns}
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for column, values in zip(columns, zip(*rows)):
+                if column not in dtype:
+                    dtype[column] = infer_dtype(values)
+                chunks[column].append(column_array(values, dtype[column]))
+    except Exception:
+        # A half-read or failed statement can't be reused
+        forget_cursor(conn, query)
+        raise
+
+    data = {}
+    for column in columns:
+        array = np.concatenate(chunks[column]) if chunks[column] else np.array([], dtype=object if dtype.get(column) in (None, 'category') else dtype[column])
+        data[column] = pd.Categorical(array) if dtype.get(column) == 'category' else array
+    df = pd.DataFrame(data, columns=columns)
+    return df.set_index(index_col) if index_col else df
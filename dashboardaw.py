@@ -1,204 +1,14 @@
-import os
 import streamlit as st
-import mysql.connector
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from gtts import gTTS
-import tempfile
-import os
+from concurrent.futures import as_completed
+from awdata import get_setting, get_connection_pool, get_result_cache, get_calendar_index, refresh_data, age_as_of, load_years, DatasetContext
+from tts import text_to_speech, start_prewarm
+from charts import sales_by_month_chart, top_sales_by_country_chart, sales_by_category_chart, sales_profit_scatter, profit_trend_by_gender_chart, profit_by_age_chart, profit_by_profession_chart, memoized_figure
+from instrumentation import measure, run_records, start_run, start_profile, stop_profile
 
 st.set_page_config(layout="wide", page_title="Adventure Works Dashboard")
 
-def create_connection():
-    try:
-        conn = mysql.connector.connect(
-            host=st.secrets["DB_HOST"],
-            port=st.secrets["DB_PORT"],
-            user=st.secrets["DB_USER"],
-            password=st.secrets["DB_PASSWORD"],
-            database=st.secrets["DB_DATABASE"]
-        )
-        return conn
-    except mysql.connector.Error as err:
-        st.error(f"Error: {err}")
-        return None
-
-def text_to_speech_gtts(text, lang='id'):
-    tts = gTTS(text=text, lang=lang)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmpfile:
-        tts.save(tmpfile.name)
-        return tmpfile.name
-
-def load_data_overview(year):
-    conn = create_connection()
-    if conn is None:
-        return None, None, None, None 
-
-    try:
-        query_sales = f"""
-        SELECT 
-            SUM(SalesAmount) AS TotalSales, 
-            SUM(OrderQuantity) AS TotalQuantity,
-            SUM(SalesAmount - TotalProductCost) AS Profit,
-            SUM(SalesAmount - TotalProductCost) / SUM(SalesAmount) * 100 AS ProfitPercentage
-        FROM factinternetsales
-        JOIN dimtime ON factinternetsales.OrderDateKey = dimtime.TimeKey
-        WHERE dimtime.CalendarYear = {year}
-        """
-        df_sales = pd.read_sql(query_sales, conn)
-
-
-        query_sales_by_month = f"""
-        SELECT 
-            MONTH(dimtime.FullDateAlternateKey) AS Month,
-            SUM(factinternetsales.SalesAmount) AS Sales,
-            SUM(factinternetsales.OrderQuantity) AS Quantity
-        FROM factinternetsales
-        JOIN dimtime ON factinternetsales.OrderDateKey = dimtime.TimeKey
-        WHERE dimtime.CalendarYear = {year}
-        GROUP BY MONTH(dimtime.FullDateAlternateKey)
-        """
-        df_sales_by_month = pd.read_sql(query_sales_by_month, conn)
-
-        query = f"""
-        SELECT 
-            SUM(SalesAmount) AS TotalSales, 
-            SUM(SalesAmount - TotalProductCost) AS Profit,
-            dimproduct.EnglishProductName AS Product,
-            dimsalesterritory.SalesTerritoryCountry AS Territory
-        FROM factinternetsales
-        JOIN dimproduct ON factinternetsales.ProductKey = dimproduct.ProductKey
-        JOIN dimsalesterritory ON factinternetsales.SalesTerritoryKey = dimsalesterritory.SalesTerritoryKey
-        JOIN dimtime ON factinternetsales.OrderDateKey = dimtime.TimeKey
-        WHERE dimtime.CalendarYear = {year}
-        GROUP BY dimproduct.EnglishProductName, dimsalesterritory.SalesTerritoryCountry
-        """
-        df = pd.read_sql(query, conn)
-
-        query_sales_by_category = f"""
-        SELECT 
-            dimproductcategory.EnglishProductCategoryName AS Category,
-            SUM(factinternetsales.SalesAmount) AS Sales
-        FROM factinternetsales
-        JOIN dimproduct ON factinternetsales.ProductKey = dimproduct.ProductKey
-        JOIN dimproductsubcategory ON dimproduct.ProductSubcategoryKey = dimproductsubcategory.ProductSubcategoryKey
-        JOIN dimproductcategory ON dimproductsubcategory.ProductCategoryKey = dimproductcategory.ProductCategoryKey
-        JOIN dimtime ON factinternetsales.OrderDateKey = dimtime.TimeKey
-        WHERE dimtime.CalendarYear = {year}
-        GROUP BY dimproductcategory.EnglishProductCategoryName
-        """
-        df_sales_by_category = pd.read_sql(query_sales_by_category, conn)
-
-        query_product_sales = """
-        SELECT 
-            dimproduct.EnglishProductName AS Product,
-            SUM(factinternetsales.OrderQuantity) AS Orders,
-            SUM(factinternetsales.SalesAmount) AS Revenue,
-            SUM(factinternetsales.SalesAmount - factinternetsales.TotalProductCost) AS Profit
-        FROM factinternetsales
-        JOIN dimproduct ON factinternetsales.ProductKey = dimproduct.ProductKey
-        GROUP BY dimproduct.EnglishProductName
-        ORDER BY Revenue DESC
-        """
-        df_product_sales = pd.read_sql(query_product_sales, conn)
-
-        query_top_sales_by_country = f"""
-        SELECT 
-            SalesTerritoryCountry,
-            SUM(SalesAmount) AS TotalSales
-        FROM factinternetsales
-        JOIN dimsalesterritory ON factinternetsales.SalesTerritoryKey = dimsalesterritory.SalesTerritoryKey
-        JOIN dimtime ON factinternetsales.OrderDateKey = dimtime.TimeKey
-        WHERE dimtime.CalendarYear = {year}
-        GROUP BY SalesTerritoryCountry
-        ORDER BY TotalSales DESC
-        LIMIT 5
-        """
-        df_top_sales_by_country = pd.read_sql(query_top_sales_by_country, conn)
-
-        country_mapping = {
-            'United States': 'USA',
-            'United Kingdom': 'UK'
-        }
-
-        df_top_sales_by_country['SalesTerritoryCountry'] = df_top_sales_by_country['SalesTerritoryCountry'].replace(country_mapping)
-
-        return df_sales, df, df_product_sales, df_sales_by_month, df_sales_by_category, df_top_sales_by_country
-    except mysql.connector.Error as err:
-        st.error(f"Error: {err}")
-        return None, None, None, None
-    finally:
-        conn.close()
-
-def load_data_customer():
-    conn = create_connection()
-    if conn is None:
-        return None
-
-    try:
-        query_total_customers = """
-        SELECT COUNT(*) AS TotalCustomers
-        FROM dimcustomer
-        """
-        df_total_customers = pd.read_sql(query_total_customers, conn)
-
-        query_gender_distribution = """
-        SELECT Gender, COUNT(*) AS Count 
-        FROM dimcustomer 
-        GROUP BY Gender
-        """
-        df_gender_distribution = pd.read_sql(query_gender_distribution, conn)
-
-        query_average_revenue = """
-        SELECT AVG(SalesAmount) AS AverageRevenuePerCustomer
-        FROM factinternetsales
-        """
-        df_average_revenue = pd.read_sql(query_average_revenue, conn)
-
-        query_profit_trend_by_gender = """
-        SELECT MONTH(dimtime.FullDateAlternateKey) AS Month, Gender, SUM(SalesAmount - TotalProductCost) AS Profit
-        FROM factinternetsales
-        JOIN dimcustomer ON factinternetsales.CustomerKey = dimcustomer.CustomerKey
-        JOIN dimtime ON factinternetsales.OrderDateKey = dimtime.TimeKey
-        GROUP BY MONTH(dimtime.FullDateAlternateKey), Gender
-        ORDER BY Month
-        """
-        df_profit_trend_by_gender = pd.read_sql(query_profit_trend_by_gender, conn)
-
-        query_profit_by_age_group = """
-        SELECT AgeGroup, SUM(SalesAmount - TotalProductCost) AS Profit
-        FROM (
-            SELECT CASE 
-                WHEN TIMESTAMPDIFF(YEAR, BirthDate, CURDATE()) < 30 THEN '< 30 Years'
-                WHEN TIMESTAMPDIFF(YEAR, BirthDate, CURDATE()) BETWEEN 30 AND 39 THEN '30 - 39 Years'
-                WHEN TIMESTAMPDIFF(YEAR, BirthDate, CURDATE()) BETWEEN 40 AND 49 THEN '40 - 49 Years'
-                WHEN TIMESTAMPDIFF(YEAR, BirthDate, CURDATE()) BETWEEN 50 AND 59 THEN '50 - 59 Years'
-                WHEN TIMESTAMPDIFF(YEAR, BirthDate, CURDATE()) BETWEEN 60 AND 69 THEN '60 - 69 Years'
-                ELSE '> 70 Years'
-            END AS AgeGroup,
-            SalesAmount, TotalProductCost
-            FROM factinternetsales
-            JOIN dimcustomer ON factinternetsales.CustomerKey = dimcustomer.CustomerKey
-        ) AS AgeData
-        GROUP BY AgeGroup
-        """
-        df_profit_by_age_group = pd.read_sql(query_profit_by_age_group, conn)
-
-        query_profit_by_profession = """
-        SELECT EnglishOccupation AS Profession, SUM(SalesAmount - TotalProductCost) AS Profit
-        FROM factinternetsales
-        JOIN dimcustomer ON factinternetsales.CustomerKey = dimcustomer.CustomerKey
-        GROUP BY EnglishOccupation
-        """
-        df_profit_by_profession = pd.read_sql(query_profit_by_profession, conn)
-
-        return df_total_customers, df_average_revenue, df_gender_distribution, df_profit_trend_by_gender, df_profit_by_age_group, df_profit_by_profession
-    except mysql.connector.Error as err:
-        st.error(f"Error: {err}")
-        return None
-    finally:
-        conn.close()
+start_run(log_file=get_setting("PERF_LOG_FILE"))
 
 def format_number(number):
     if isinstance(number, str):
@@ -212,100 +22,103 @@ def format_number(number):
     else:
         return f"{number:.2f}"
 
-@st.cache_data
-def load_years():
-    conn = create_connection()
-    if conn is None:
-        return []
-
-    try:
-        query_years = """
-        SELECT DISTINCT CalendarYear
-        FROM dimtime
-        WHERE
-        CalendarYear BETWEEN 2001 AND 2004
-        """
-        df_years = pd.read_sql(query_years, conn)
-        years = df_years['CalendarYear'].tolist()
-        years = sorted(years, reverse=True) 
-        return years
-    except mysql.connector.Error as err:
-        st.error(f"Error: {err}")
-        return []
-    finally:
-        conn.close()
-
-years = load_years()
-
-# Sidebar
-with st.sidebar:
-    st.image('logoaw.png', use_column_width=True)
-    page = st.selectbox("Select Page", ["Sales Overview", "Customer Analysis"])
-
-if page == "Sales Overview":
-    selected_year = st.sidebar.selectbox("Select Year", options=years)
-
-    if selected_year:
-        df_sales, df, df_product_sales, df_sales_by_month, df_sales_by_category, df_top_sales_by_country = load_data_overview(selected_year)
-
-        if df_sales is not None:
-            st.title(f"Sales Overview - {selected_year}")
-            total_sales = format_number(df_sales['TotalSales'].values[0])
-            total_quantity = format_number(df_sales['TotalQuantity'].values[0])
-            profit = format_number(df_sales['Profit'].values[0])
-            profit_percentage = df_sales['ProfitPercentage'].values[0]
+@st.fragment
+def narration_section(narration):
+    if st.button("Convert to Speech"):
+        audio, audio_format = text_to_speech(narration, lang='id')
+        st.audio(audio, format=audio_format)
 
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric(label="Total Sales", value=total_sales)
-            col2.metric(label="Total Quantity", value=total_quantity)
-            col3.metric(label="Profit", value=profit)
-            col4.metric(label="Profit %", value=f"{profit_percentage:.1f}%")
+@st.fragment
+def chart_section(name, build, frame, **options):
+    if frame is None:
+        st.error("Data not available to display.")
+        return
+    with measure("chart", name) as record:
+        found, fig = memoized_figure(build, frame, **options)
+        record['cache'] = 'hit' if found else 'miss'
+        st.plotly_chart(fig, use_container_width=True)
+
+def fill_chart(slot, name, build, options, frame):
+    with slot.container():
+        chart_section(name, build, frame, **options)
+
+@st.fragment
+def overview_kpis(df_sales):
+    total_sales = format_number(df_sales['TotalSales'].values[0])
+    total_quantity = format_number(df_sales['TotalQuantity'].values[0])
+    profit = format_number(df_sales['Profit'].values[0])
+    profit_percentage = df_sales['ProfitPercentage'].values[0]
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric(label="Total Sales", value=total_sales)
+    col2.metric(label="Total Quantity", value=total_quantity)
+    col3.metric(label="Profit", value=profit)
+    col4.metric(label="Profit %", value=f"{profit_percentage:.1f}%")
+
+@st.fragment
+def customer_kpis(df_total_customers, df_average_revenue, df_gender_distribution):
+    total_customers = format_number(df_total_customers['TotalCustomers'].values[0])
+    average_revenue_per_customer = format_number(df_average_revenue['AverageRevenuePerCustomer'].values[0])
+    total_male_customers = df_gender_distribution[df_gender_distribution['Gender'] == 'M']['Count'].values[0]
+    total_female_customers = df_gender_distribution[df_gender_distribution['Gender'] == 'F']['Count'].values[0]
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric(label="Total Customers", value=total_customers)
+    col2.metric(label="Avg Revenue per Customer", value=average_revenue_per_customer)
+    col3.metric(label="Male Customers", value=total_male_customers)
+    col4.metric(label="Female Customers", value=total_female_customers)
+
+SALES_OVERVIEW_NARRATION = "Berdasarkan analisis data penjualan Adventure Works dari tahun dua ribu satu hingga dua ribu empat, terlihat tren peningkatan yang signifikan dalam kinerja penjualan perusahaan. Total penjualan meningkat dari tiga koma dua tujuh juta USD pada tahun dua ribu satu menjadi sembilan koma tujuh tujuh juta USD pada tahun dua ribu empat, yang menunjukkan pertumbuhan lebih dari tiga kali lipat dalam empat tahun. Kuantitas produk yang terjual juga meningkat secara konsisten setiap tahun, dari satu koma nol ribu unit pada tahun dua ribu satu menjadi tiga puluh dua koma tiga ribu unit pada tahun dua ribu empat. Meskipun total penjualan dan kuantitas meningkat, profit tetap stabil dengan sedikit penurunan dari empat koma nol tujuh juta USD pada tahun dua ribu tiga menjadi empat koma nol lima juta USD pada tahun dua ribu empat. Persentase keuntungan relatif stabil dengan sedikit fluktuasi, menunjukkan efisiensi operasional yang baik. Margin keuntungan tetap kuat di sekitar empat puluh persen, mencerminkan kemampuan perusahaan untuk mempertahankan profitabilitas yang tinggi meskipun ada peningkatan dalam volume penjualan. Data ini menunjukkan performa yang mengesankan dan pertumbuhan yang berkelanjutan dari Adventure Works."
+
+CUSTOMER_ANALYSIS_NARRATION = "Analisis pelanggan Adventure Works menunjukkan bahwa total pelanggan mencapai delapan belas ribu lima ratus dengan rata-rata pendapatan per pelanggan sebesar empat ratus delapan puluh enam dolar dan empat sen. Pembagian gender pelanggan cukup seimbang, dengan sembilan ribu tiga ratus lima puluh satu pelanggan laki-laki dan sembilan ribu seratus tiga puluh tiga pelanggan perempuan. Hal ini menandakan bahwa produk dan layanan Adventure Works berhasil menarik minat yang hampir sama antara kedua gender, menunjukkan inklusivitas dan daya tarik yang luas dari penawaran perusahaan."
+
+if get_setting("TTS_PREWARM", False):
+    start_prewarm((SALES_OVERVIEW_NARRATION, CUSTOMER_ANALYSIS_NARRATION), lang='id')
+
+profiling = get_setting("PROFILE_RERUNS", False) or st.session_state.get("profile_reruns", False)
+profiler = start_profile() if profiling else None
+
+try:
+    # Sidebar
+    with st.sidebar:
+        st.image('logoaw.png', use_column_width=True)
+        page = st.selectbox("Select Page", ["Sales Overview", "Customer Analysis"])
+        if get_setting("ADMIN_MODE", False) and st.button("Refresh data"):
+            refresh_data()
+
+    years = load_years()
+
+    if page == "Sales Overview":
+        selected_year = st.sidebar.selectbox("Select Year", options=years)
+
+        date_range = None
+        calendar = get_calendar_index() if selected_year else None
+        if calendar is not None and st.sidebar.checkbox("Filter by date range"):
+            first_day, last_day = calendar.year_dates(selected_year)
+            picked = st.sidebar.date_input("Date range", value=(first_day, last_day), min_value=first_day, max_value=last_day)
+            if len(picked) == 2:
+                date_range = tuple(picked)
+
+        if selected_year:
+            datasets = DatasetContext(year=selected_year, date_range=date_range)
+            futures = datasets.prefetch('sales', 'sales_by_month', 'top_sales_by_country', 'sales_by_category', 'sales_by_product_territory')
+
+            st.title(f"Sales Overview - {selected_year}")
+            kpi_slot = st.empty()
 
             st.markdown("""
                 <div style='text-align: justify;'>
                     Berdasarkan analisis data penjualan Adventure Works dari tahun 2001 hingga 2004, terlihat tren peningkatan yang signifikan dalam kinerja penjualan perusahaan. Total penjualan meningkat dari 3,27 juta USD pada tahun 2001 menjadi 9,77 juta USD pada tahun 2004, yang menunjukkan pertumbuhan lebih dari tiga kali lipat dalam empat tahun. Kuantitas produk yang terjual juga meningkat secara konsisten setiap tahun, dari 1,0 ribu unit pada tahun 2001 menjadi 32,3 ribu unit pada tahun 2004. Meskipun total penjualan dan kuantitas meningkat, profit tetap stabil dengan sedikit penurunan dari 4,07 juta USD pada tahun 2003 menjadi 4,05 juta USD pada tahun 2004. Persentase keuntungan relatif stabil dengan sedikit fluktuasi, menunjukkan efisiensi operasional yang baik. Margin keuntungan tetap kuat di sekitar 40%, mencerminkan kemampuan perusahaan untuk mempertahankan profitabilitas yang tinggi meskipun ada peningkatan dalam volume penjualan. Data ini menunjukkan performa yang mengesankan dan pertumbuhan yang berkelanjutan dari Adventure Works.
                 </div>
                 """, unsafe_allow_html=True)
-            
+        
             st.markdown(f"<p style='padding-top: 8px;'></p>", unsafe_allow_html=True)
-            if st.button("Convert to Speech"):
-                text = f"Berdasarkan analisis data penjualan Adventure Works dari tahun dua ribu satu hingga dua ribu empat, terlihat tren peningkatan yang signifikan dalam kinerja penjualan perusahaan. Total penjualan meningkat dari tiga koma dua tujuh juta USD pada tahun dua ribu satu menjadi sembilan koma tujuh tujuh juta USD pada tahun dua ribu empat, yang menunjukkan pertumbuhan lebih dari tiga kali lipat dalam empat tahun. Kuantitas produk yang terjual juga meningkat secara konsisten setiap tahun, dari satu koma nol ribu unit pada tahun dua ribu satu menjadi tiga puluh dua koma tiga ribu unit pada tahun dua ribu empat. Meskipun total penjualan dan kuantitas meningkat, profit tetap stabil dengan sedikit penurunan dari empat koma nol tujuh juta USD pada tahun dua ribu tiga menjadi empat koma nol lima juta USD pada tahun dua ribu empat. Persentase keuntungan relatif stabil dengan sedikit fluktuasi, menunjukkan efisiensi operasional yang baik. Margin keuntungan tetap kuat di sekitar empat puluh persen, mencerminkan kemampuan perusahaan untuk mempertahankan profitabilitas yang tinggi meskipun ada peningkatan dalam volume penjualan. Data ini menunjukkan performa yang mengesankan dan pertumbuhan yang berkelanjutan dari Adventure Works."
-                audio_file = text_to_speech_gtts(text, lang='id')
-                st.audio(audio_file)
-                os.remove(audio_file)
-            
+            narration_section(SALES_OVERVIEW_NARRATION)
+
             col1, col2 = st.columns(2)
 
             with col1:
-                #Grafik Sales by Month
-                fig_sales_month = px.line(df_sales_by_month, x='Month', y='Sales', title='Sales by Month', markers=True, color_discrete_sequence=['#003f5c'])
-                st.plotly_chart(fig_sales_month, use_container_width=True)
-
-                #Grafik 5 Sales by Country
-                fig_top_sales_country = px.bar(
-                        df_top_sales_by_country, 
-                        x='SalesTerritoryCountry', 
-                        y='TotalSales', 
-                        title='Top 5 Sales by Country', 
-                        color_discrete_sequence=['#ffa600'],
-                    )
-                fig_top_sales_country.update_layout(xaxis={'tickangle': 0})
-                st.plotly_chart(fig_top_sales_country, use_container_width=True)
-
-                #Grafik Sales by Category
-                fig_sales_category = px.pie(df_sales_by_category, names='Category', values='Sales', title='Sales by Category', color_discrete_sequence=['#003f5c','#665191','#a05195'])
-                st.plotly_chart(fig_sales_category, use_container_width=True)
-                
-                #Scatter
-                fig_scatter = px.scatter(
-                    df,
-                    x='TotalSales',
-                    y='Profit',
-                    color='Territory',
-                    hover_data=['Product'],
-                    title='Sales vs. Profit Analysis'
-                )
-                st.plotly_chart(fig_scatter, use_container_width=True)
+                chart_slots = [st.empty() for _ in range(4)]
 
             with col2:
                 st.markdown(f"<p style='padding-top: 5px;'></p>", unsafe_allow_html=True)
@@ -337,28 +150,47 @@ if page == "Sales Overview":
                 <div style='text-align: justify;'>
                 Dari analisis data penjualan dan profit Adventure Works untuk tahun 2001 hingga 2004, terlihat adanya korelasi positif yang kuat antara total penjualan dan profit di berbagai wilayah. Scatter plot digunakan karena memberikan visualisasi yang jelas tentang hubungan antara dua variabel kontinu, dalam hal ini total penjualan dan profit, serta memungkinkan identifikasi pola atau tren yang mungkin tidak terlihat dalam tabel data biasa. Visualisasi ini menunjukkan bahwa Amerika Serikat konsisten mendominasi dengan total penjualan dan profit tertinggi, diikuti oleh Australia dan Kanada. Selain itu, scatter plot membantu mengidentifikasi outlier atau nilai ekstrem yang dapat memberikan wawasan tambahan tentang anomali atau peluang pasar tertentu. Dengan menggunakan scatter plot, kita dapat dengan mudah melihat distribusi data dan memahami bagaimana performa penjualan di berbagai wilayah berkontribusi terhadap profit perusahaan. 
                 """, unsafe_allow_html=True)
-        else:
-            st.error("Data not available for the selected year.")
 
-    else:
-        st.error("No year selected.")
-
-elif page == "Customer Analysis":
-    df_total_customers, df_average_revenue, df_gender_distribution, df_profit_trend_by_gender, df_profit_by_age_group, df_profit_by_profession = load_data_customer()
+            charts_by_dataset = {
+                #Grafik Sales by Month
+                'sales_by_month': (chart_slots[0], "Sales by Month", sales_by_month_chart, {}),
+                #Grafik 5 Sales by Country
+                'top_sales_by_country': (chart_slots[1], "Top 5 Sales by Country", top_sales_by_country_chart, {}),
+                #Grafik Sales by Category
+                'sales_by_category': (chart_slots[2], "Sales by Category", sales_by_category_chart, {}),
+                #Scatter
+                'sales_by_product_territory': (chart_slots[3], "Sales vs. Profit Analysis", sales_profit_scatter, {
+                    'webgl_threshold': int(get_setting("CHART_WEBGL_THRESHOLD", 1000)),
+                    'max_points': int(get_setting("CHART_SCATTER_MAX_POINTS", 0)) or None,
+                }),
+            }
+
+            # Slots are filled in the order their datasets arrive, so a slow query only holds up its own chart
+            for future in as_completed(futures):
+                name = futures[future]
+                if name != 'sales':
+                    fill_chart(*charts_by_dataset[name], future.result())
+                    continue
+
+                df_sales = future.result()
+                if df_sales is None:
+                    kpi_slot.error("Data not available for the selected year.")
+                elif pd.isna(df_sales['TotalSales'].values[0]):
+                    # A date range with no orders sums to a single row of NULLs
+                    kpi_slot.error("No orders in the selected period.")
+                else:
+                    with kpi_slot.container():
+                        overview_kpis(df_sales)
 
-    if df_total_customers is not None and df_average_revenue is not None:
-        st.title("Customer Analysis")
+        else:
+            st.error("No year selected.")
 
-        total_customers = format_number(df_total_customers['TotalCustomers'].values[0])
-        average_revenue_per_customer = format_number(df_average_revenue['AverageRevenuePerCustomer'].values[0])
-        total_male_customers = df_gender_distribution[df_gender_distribution['Gender'] == 'M']['Count'].values[0]
-        total_female_customers = df_gender_distribution[df_gender_distribution['Gender'] == 'F']['Count'].values[0]
+    elif page == "Customer Analysis":
+        datasets = DatasetContext(as_of=age_as_of())
+        futures = datasets.prefetch('total_customers', 'average_revenue', 'gender_distribution', 'profit_trend_by_gender', 'profit_by_age_group', 'profit_by_profession')
 
-        col1, col2, col3, col4 = st.columns(4)
-        col1.metric(label="Total Customers", value=total_customers)
-        col2.metric(label="Avg Revenue per Customer", value=average_revenue_per_customer)
-        col3.metric(label="Male Customers", value=total_male_customers)
-        col4.metric(label="Female Customers", value=total_female_customers)
+        st.title("Customer Analysis")
+        kpi_slot = st.empty()
 
         st.markdown("""
         <div style='text-align: justify;'>
@@ -367,29 +199,12 @@ elif page == "Customer Analysis":
         """, unsafe_allow_html=True)
 
         st.markdown(f"<p style='padding-top: 8px;'></p>", unsafe_allow_html=True)
-        if st.button("Convert to Speech"):
-            text = f"Analisis pelanggan Adventure Works menunjukkan bahwa total pelanggan mencapai delapan belas ribu lima ratus dengan rata-rata pendapatan per pelanggan sebesar empat ratus delapan puluh enam dolar dan empat sen. Pembagian gender pelanggan cukup seimbang, dengan sembilan ribu tiga ratus lima puluh satu pelanggan laki-laki dan sembilan ribu seratus tiga puluh tiga pelanggan perempuan. Hal ini menandakan bahwa produk dan layanan Adventure Works berhasil menarik minat yang hampir sama antara kedua gender, menunjukkan inklusivitas dan daya tarik yang luas dari penawaran perusahaan."
-            audio_file = text_to_speech_gtts(text, lang='id')
-            st.audio(audio_file)
-            os.remove(audio_file)
-            
-        color_palette = ['#003f5c', '#58508d', '#bc5090', '#ff6361', '#ffa600']
+        narration_section(CUSTOMER_ANALYSIS_NARRATION)
 
         col1, col2 = st.columns(2)
 
         with col1:
-            # Visualize profit trend by gender
-            fig_profit_trend = px.line(df_profit_trend_by_gender, x='Month', y='Profit', title='Profit Trend by Gender', color='Gender', 
-                                       color_discrete_sequence=['#1f77b4', '#bc5090'])
-            st.plotly_chart(fig_profit_trend, use_container_width=True)
-
-            # Visualize profit by age group
-            fig_profit_age = px.bar(df_profit_by_age_group, x='AgeGroup', y='Profit', title='Profit by Age', text='Profit', color='AgeGroup', color_discrete_sequence=color_palette)
-            st.plotly_chart(fig_profit_age, use_container_width=True)
-
-            # Visualize profit by customer profession
-            fig_profit_profession = px.bar(df_profit_by_profession, x='Profit', y='Profession', title='Profit by Customer Profession', color='Profession', color_discrete_sequence=color_palette)
-            st.plotly_chart(fig_profit_profession, use_container_width=True)
+            chart_slots = [st.empty() for _ in range(3)]
 
         with col2:
             st.markdown(f"<p style='padding-top: 30px;'></p>", unsafe_allow_html=True)
@@ -400,7 +215,7 @@ elif page == "Customer Analysis":
                     Penggunaan grafik garis sangat efektif dalam kasus ini karena memungkinkan untuk melihat perubahan keuntungan yang halus dan terus-menerus selama periode waktu yang ditentukan. Ini juga memudahkan perbandingan langsung antara keuntungan dari pelanggan pria dan wanita, menunjukkan bahwa keduanya cenderung memiliki pola pengeluaran yang sangat mirip. 
                 </div>
                 """, unsafe_allow_html=True)       
-             
+         
             st.markdown(f"<p style='padding-top: 50px;'></p>", unsafe_allow_html=True)
             st.subheader("Grafik Profit by Age")
             st.markdown("""
@@ -409,7 +224,7 @@ elif page == "Customer Analysis":
                     Penggunaan grafik batang memudahkan untuk melihat perbandingan keuntungan secara langsung antar kelompok usia. Diagram menunjukkan bahwa pelanggan yang lebih tua, khususnya yang berusia di atas 70 tahun, merupakan segmen pasar yang sangat penting dan paling menguntungkan bagi Adventure Works. 
                 </div>
                 """, unsafe_allow_html=True)  
-            
+        
             st.markdown(f"<p style='padding-top: 80px;'></p>", unsafe_allow_html=True)
             st.subheader("Profit by Customer Profession")
             st.markdown("""
@@ -418,7 +233,48 @@ elif page == "Customer Analysis":
                 </div>
                 """, unsafe_allow_html=True)       
 
-    else:
-        st.error("Data not available to display.")
-
+        charts_by_dataset = {
+            # Visualize profit trend by gender
+            'profit_trend_by_gender': (chart_slots[0], "Profit Trend by Gender", profit_trend_by_gender_chart, {}),
+            # Visualize profit by age group
+            'profit_by_age_group': (chart_slots[1], "Profit by Age", profit_by_age_chart, {}),
+            # Visualize profit by customer profession
+            'profit_by_profession': (chart_slots[2], "Profit by Customer Profession", profit_by_profession_chart, {}),
+        }
 
+        kpi_names = ('total_customers', 'average_revenue', 'gender_distribution')
+        kpi_frames = {}
+        for future in as_completed(futures):
+            name = futures[future]
+            if name not in kpi_names:
+                fill_chart(*charts_by_dataset[name], future.result())
+                continue
+
+            kpi_frames[name] = future.result()
+            if len(kpi_frames) < len(kpi_names):
+                continue
+            if all(frame is not None for frame in kpi_frames.values()):
+                with kpi_slot.container():
+                    customer_kpis(*(kpi_frames[kpi_name] for kpi_name in kpi_names))
+            else:
+                kpi_slot.error("Data not available to display.")
+
+    if get_setting("DB_POOL_SHOW_STATS", False):
+        with st.sidebar.expander("Connection pool"):
+            st.json(get_connection_pool().stats())
+
+    if get_setting("ADMIN_MODE", False):
+        with st.sidebar.expander("Result cache"):
+            st.json(get_result_cache().stats())
+finally:
+    # Runs on st.stop, reruns and errors too, so the profiler is never left enabled for the next session
+    profile_path = stop_profile(profiler, get_setting("PROFILE_DIR", "profiles")) if profiler is not None else None
+
+if get_setting("PERF_PANEL", False):
+    with st.sidebar.expander("Performance"):
+        st.dataframe(pd.DataFrame(run_records()), use_container_width=True)
+        st.checkbox("Profile reruns", key="profile_reruns")
+        if profile_path:
+            st.caption(f"Profile written to {profile_path}")
+        if profiling:
+            st.caption("The profile covers the script thread only; dataset queries run on worker threads and show up there as waits. Use the dataset and query timings above for those.")
@@ -0,0 +1,92 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+_lock = threading.Lock()
+# Streamlit has no session-end hook, so both dimensions are capped instead: the least
+# recently started sessions are dropped, and records without a session (TTS pre-warm,
+# benchmarks) keep only the latest MAX_RECORDS
+_runs = OrderedDict()
+MAX_SESSIONS = 256
+MAX_RECORDS = 1000
+_log_file = None
+
+def _session_id():
+    # Worker threads started by DatasetContext.prefetch carry the session's script run context;
+    # the TTS pre-warm thread and bare-mode scripts have none, which is expected
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+def start_run(log_file=None):
+    global _log_file
+    _log_file = log_file
+    session_id = _session_id()
+    with _lock:
+        _runs[session_id] = deque(maxlen=MAX_RECORDS)
+        _runs.move_to_end(session_id)
+        while len(_runs) > MAX_SESSIONS:
+            _runs.popitem(last=False)
+
+def run_records():
+    with _lock:
+        return list(_runs.get(_session_id(), []))
+
+def wait_percentiles(wait_times):
+    waits = sorted(wait_times)
+    if not waits:
+        return {}
+    return {
+        "wait_ms_p50": round(waits[len(waits) // 2] * 1000, 2),
+        "wait_ms_p95": round(waits[int(len(waits) * 0.95)] * 1000, 2),
+        "wait_ms_max": round(waits[-1] * 1000, 2),
+    }
+
+def describe_result(record, result):
+    if isinstance(result, pd.DataFrame):
+        record['rows'] = len(result)
+        record['bytes'] = int(result.memory_usage(index=True, deep=True).sum())
+    elif isinstance(result, bytes):
+        record['bytes'] = len(result)
+
+@contextmanager
+def measure(kind, name, **fields):
+    record = {'kind': kind, 'name': name, **fields}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['ms'] = round((time.perf_counter() - start) * 1000, 2)
+        _finish(record)
+
+def _finish(record):
+    session_id = _session_id()
+    with _lock:
+        if session_id not in _runs:
+            _runs[session_id] = deque(maxlen=MAX_RECORDS)
+        _runs[session_id].append(record)
+        if _log_file:
+            with open(_log_file, 'a') as f:
+                f.write(json.dumps({'ts': time.time(), 'session': session_id, **record}) + '\n')
+
+def start_profile():
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another session is already being profiled in this process
+        return None
+    return profiler
+
+def stop_profile(profiler, profile_dir):
+    profiler.disable()
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, f"rerun-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+    profiler.dump_stats(path)
+    return path
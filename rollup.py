@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+DIMENSIONS = ['Year', 'Month', 'Product', 'Category', 'Territory', 'Gender', 'Occupation', 'AgeGroup']
+MEASURES = ['SalesAmount', 'OrderQuantity', 'TotalProductCost', 'RowCount']
+
+Cube = namedtuple('Cube', ['facts', 'customers', 'meta'])
+
+_loaded = {}
+
+def query_cube_rows(conn, watermark, as_of):
+    query_cube = f"""
+    SELECT
+        dimtime.CalendarYear AS Year,
+        MONTH(dimtime.FullDateAlternateKey) AS Month,
+        dimproduct.EnglishProductName AS Product,
+        dimproductcategory.EnglishProductCategoryName AS Category,
+        dimsalesterritory.SalesTerritoryCountry AS Territory,
+        dimcustomer.Gender AS Gender,
+        dimcustomer.EnglishOccupation AS Occupation,
+        CASE
+            WHEN dimcustomer.CustomerKey IS NULL THEN NULL
+            WHEN TIMESTAMPDIFF(YEAR, dimcustomer.BirthDate, '{as_of}') < 30 THEN '< 30 Years'
+            WHEN TIMESTAMPDIFF(YEAR, dimcustomer.BirthDate, '{as_of}') BETWEEN 30 AND 39 THEN '30 - 39 Years'
+            WHEN TIMESTAMPDIFF(YEAR, dimcustomer.BirthDate, '{as_of}') BETWEEN 40 AND 49 THEN '40 - 49 Years'
+            WHEN TIMESTAMPDIFF(YEAR, dimcustomer.BirthDate, '{as_of}') BETWEEN 50 AND 59 THEN '50 - 59 Years'
+            WHEN TIMESTAMPDIFF(YEAR, dimcustomer.BirthDate, '{as_of}') BETWEEN 60 AND 69 THEN '60 - 69 Years'
+            ELSE '> 70 Years'
+        END AS AgeGroup,
+        SUM(factinternetsales.SalesAmount) AS SalesAmount,
+        SUM(factinternetsales.OrderQuantity) AS OrderQuantity,
+        SUM(factinternetsales.TotalProductCost) AS TotalProductCost,
+        COUNT(*) AS RowCount,
+        MAX(factinternetsales.OrderDateKey) AS Watermark
+    FROM factinternetsales
+    JOIN dimtime ON factinternetsales.OrderDateKey = dimtime.TimeKey
+    LEFT JOIN dimproduct ON factinternetsales.ProductKey = dimproduct.ProductKey
+    LEFT JOIN dimproductsubcategory ON dimproduct.ProductSubcategoryKey = dimproductsubcategory.ProductSubcategoryKey
+    LEFT JOIN dimproductcategory ON dimproductsubcategory.ProductCategoryKey = dimproductcategory.ProductCategoryKey
+    LEFT JOIN dimsalesterritory ON factinternetsales.SalesTerritoryKey = dimsalesterritory.SalesTerritoryKey
+    LEFT JOIN dimcustomer ON factinternetsales.CustomerKey = dimcustomer.CustomerKey
+    WHERE factinternetsales.OrderDateKey > {watermark}
+    GROUP BY Year, Month, Product, Category, Territory, Gender, Occupation, AgeGroup
+    """
+    return pd.read_sql(query_cube, conn)
+
+def query_customer_counts(conn):
+    query_customers = """
+    SELECT Gender, COUNT(*) AS Count
+    FROM dimcustomer
+    GROUP BY Gender
+    """
+    return pd.read_sql(query_customers, conn)
+
+def compact(facts):
+    facts = facts.astype({'Year': 'int16', 'Month': 'int8', 'RowCount': 'int64'})
+    facts = facts.astype({column: 'float64' for column in MEASURES if column != 'RowCount'})
+    return facts.astype({column: 'category' for column in DIMENSIONS if column not in ('Year', 'Month')})
+
+def merge(facts, new_rows):
+    combined = pd.concat([facts.astype({column: object for column in DIMENSIONS[2:]}), new_rows], ignore_index=True)
+    combined = combined.groupby(DIMENSIONS, dropna=False, as_index=False)[MEASURES].sum()
+    return compact(combined)
+
+def _paths(cube_dir):
+    return (
+        os.path.join(cube_dir, 'facts.parquet'),
+        os.path.join(cube_dir, 'customers.parquet'),
+        os.path.join(cube_dir, 'meta.json'),
+    )
+
+def _replace(path, write):
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def _write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+def refresh_cube(conn, cube_dir, as_of, full=False):
+    facts_path, customers_path, meta_path = _paths(cube_dir)
+    os.makedirs(cube_dir, exist_ok=True)
+
+    meta = None
+    if not full and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    # Age bands in stored rows are only valid for the date they were computed as of, so
+    # a new age date means banding every row again
+    if meta is not None and meta['as_of'] != as_of.isoformat():
+        meta = None
+
+    if meta is None:
+        meta = {'watermark': -1, 'as_of': as_of.isoformat()}
+        facts = None
+    else:
+        facts = pd.read_parquet(facts_path)
+
+    new_rows = query_cube_rows(conn, meta['watermark'], meta['as_of'])
+    if not new_rows.empty:
+        meta['watermark'] = int(new_rows['Watermark'].max())
+    new_rows = new_rows.drop(columns='Watermark')
+    facts = compact(new_rows) if facts is None else merge(facts, new_rows)
+    customers = query_customer_counts(conn)
+
+    meta['refreshed_at'] = time.time()
+    meta['rows'] = len(facts)
+    _replace(facts_path, lambda path: facts.to_parquet(path, index=False))
+    _replace(customers_path, lambda path: customers.to_parquet(path, index=False))
+    _replace(meta_path, lambda path: _write_json(path, meta))
+    return meta
+
+def read_cube(cube_dir, max_age):
+    facts_path, customers_path, meta_path = _paths(cube_dir)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - meta['refreshed_at'] > max_age:
+        return None
+
+    key = (cube_dir, meta['refreshed_at'])
+    if key not in _loaded:
+        _loaded.clear()
+        _loaded[key] = Cube(pd.read_parquet(facts_path), pd.read_parquet(customers_path), meta)
+    return _loaded[key]
+
+def year_rows(cube, year):
+    return cube.facts[cube.facts['Year'] == year]
+
+def aggregate_product_sales(facts):
+    df_product_sales = (
+        facts.groupby('Product', observed=True)[['OrderQuantity', 'SalesAmount', 'TotalProductCost']].sum()
+        .reset_index()
+        .astype({'Product': object})
+    )
+    df_product_sales['Profit'] = df_product_sales['SalesAmount'] - df_product_sales['TotalProductCost']
+    df_product_sales = df_product_sales.rename(columns={'OrderQuantity': 'Orders', 'SalesAmount': 'Revenue'})
+    return df_product_sales[['Product', 'Orders', 'Revenue', 'Profit']].sort_values('Revenue', ascending=False, ignore_index=True)
+
+def aggregate_customer(cube):
+    facts = cube.facts.assign(Profit=cube.facts['SalesAmount'] - cube.facts['TotalProductCost'])
+
+    df_total_customers = pd.DataFrame({'TotalCustomers': [int(cube.customers['Count'].sum())]})
+    df_gender_distribution = cube.customers
+    rows = facts['RowCount'].sum()
+    df_average_revenue = pd.DataFrame({'AverageRevenuePerCustomer': [facts['SalesAmount'].sum() / rows if rows else None]}, dtype='float64')
+
+    df_profit_trend_by_gender = (
+        facts.groupby(['Month', 'Gender'], observed=True)['Profit'].sum()
+        .reset_index()
+        .astype({'Month': 'int64', 'Gender': object})
+    )
+    df_profit_by_age_group = (
+        facts.groupby('AgeGroup', observed=True)['Profit'].sum()
+        .reset_index()
+        .astype({'AgeGroup': object})
+    )
+    df_profit_by_profession = (
+        facts.groupby('Occupation', observed=True)['Profit'].sum()
+        .rename_axis('Profession')
+        .reset_index()
+        .astype({'Profession': object})
+    )
+
+    return df_total_customers, df_average_revenue, df_gender_distribution, df_profit_trend_by_gender, df_profit_by_age_group, df_profit_by_profession
+
+def main():
+    from awdata import age_as_of, create_connection, get_setting
+
+    parser = argparse.ArgumentParser(description="Build or incrementally refresh the dashboard rollup cube")
+    parser.add_argument('--cube-dir', default=None)
+    parser.add_argument('--full', action='store_true', help="rebuild from scratch instead of folding in new fact rows")
+    args = parser.parse_args()
+
+    conn = create_connection()
+    if conn is None:
+        raise SystemExit("Could not connect to the database")
+    try:
+        meta = refresh_cube(conn, args.cube_dir or get_setting("CUBE_DIR", ".cube"), age_as_of(), full=args.full)
+    finally:
+        conn.close()
+    print(f"Cube refreshed: {meta['rows']} rows, watermark OrderDateKey {meta['watermark']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import fcntl
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from instrumentation import wait_percentiles
+
+# Hits only write last_used back when it is older than this, so reads across replicas
+# don't queue on SQLite's single writer lock
+TOUCH_INTERVAL = 60
+
+class SharedResultCache:
+    # Same interface as awdata.ResultCache, but entries live in a SQLite file that every
+    # dashboard process on the host opens, and single flight uses per-key lock files
+    def __init__(self, path, ttl=3600, max_bytes=256 * 2**20, invalidation_file=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.invalidation_file = invalidation_file
+        self.lock_dir = f"{path}.locks"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._evictions = 0
+        self._wait_times = deque(maxlen=1000)
+        os.makedirs(self.lock_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                page TEXT,
+                expires REAL,
+                last_used REAL,
+                size INTEGER,
+                value BLOB
+            )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value REAL)")
+
+    def _connect(self):
+        # One connection per thread; WAL lets readers in other processes carry on during a write
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        found, value = self._lookup(key)
+        with self._lock:
+            if found:
+                self._hits += 1
+            else:
+                self._misses += 1
+        return found, value
+
+    def _lookup(self, key):
+        self._check_invalidation()
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, last_used FROM entries WHERE key = ? AND expires > ?", (repr(key), now)).fetchone()
+        if row is None:
+            return False, None
+        if now - row[1] > TOUCH_INTERVAL:
+            with conn:
+                conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, repr(key)))
+        return True, pickle.loads(row[0])
+
+    def get_or_compute(self, key, compute):
+        found, value = self.get(key)
+        if found:
+            return 'hit', value
+        with self._flight(key) as waited:
+            # Another session or process may have filled the key while this one waited
+            found, value = self._lookup(key)
+            if found:
+                return 'wait' if waited else 'hit', value
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+            return 'miss', value
+
+    @contextmanager
+    def _flight(self, key):
+        # flock is released by the OS if the computing process dies, so waiters never hang on it
+        path = os.path.join(self.lock_dir, f"{hashlib.sha256(repr(key).encode('utf-8')).hexdigest()}.lock")
+        with open(path, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                waited = False
+            except BlockingIOError:
+                start = time.perf_counter()
+                fcntl.flock(f, fcntl.LOCK_EX)
+                waited = True
+                with self._lock:
+                    self._waits += 1
+                    self._wait_times.append(time.perf_counter() - start)
+            try:
+                yield waited
+            finally:
+                # Removed before unlocking so lock files don't pile up for every key ever
+                # requested. A caller still queued on the old file rechecks the cache
+                # once it gets the lock, so at worst an uncacheable result is computed twice.
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def put(self, key, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (repr(key), str(key[0]), now + self.ttl, now, len(data), data),
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, size in conn.execute("SELECT key, size FROM entries WHERE key != ? ORDER BY last_used", (repr(key),)).fetchall():
+                    conn.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+                    with self._lock:
+                        self._evictions += 1
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+
+    def clear(self, page=None):
+        conn = self._connect()
+        with conn:
+            if page is None:
+                conn.execute("DELETE FROM entries")
+            else:
+                conn.execute("DELETE FROM entries WHERE page = ?", (str(page),))
+
+    def _check_invalidation(self):
+        # The nightly ETL touches this file when it finishes loading. The mtime last acted
+        # on is stored in the cache itself, so only the first process to notice clears it.
+        if not self.invalidation_file:
+            return
+        try:
+            mtime = os.stat(self.invalidation_file).st_mtime
+        except OSError:
+            mtime = None
+        conn = self._connect()
+        with conn:
+            row = conn.execute("SELECT value FROM meta WHERE name = 'invalidation_mtime'").fetchone()
+            if row is not None and row[0] == mtime:
+                return
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('invalidation_mtime', ?)", (mtime,))
+            if row is not None:
+                conn.execute("DELETE FROM entries")
+
+    def stats(self):
+        conn = self._connect()
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        with self._lock:
+            return {
+                "path": self.path,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "waits": self._waits,
+                "evictions": self._evictions,
+                **wait_percentiles(self._wait_times),
+            }
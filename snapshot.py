@@ -0,0 +1,95 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+from backends import TABLES
+from columnar import infer_dtype
+
+# Stored in date order so an embedded engine can skip whole blocks on OrderDateKey ranges
+ORDER_BY = {'factinternetsales': 'OrderDateKey'}
+
+def read_chunks(conn, table, chunksize):
+    order_by = f" ORDER BY {ORDER_BY[table]}" if table in ORDER_BY else ""
+    for chunk in pd.read_sql(f"SELECT * FROM {table}{order_by}", conn, chunksize=chunksize):
+        # DECIMAL columns come back as objects holding Decimal; store them as doubles
+        numeric = [column for column in chunk.columns if chunk[column].dtype == object and infer_dtype(chunk[column]) == 'float64']
+        yield chunk.astype({column: 'float64' for column in numeric})
+
+def write_duckdb(path, tables):
+    import duckdb
+
+    conn = duckdb.connect(path)
+    try:
+        for table, chunks in tables:
+            for i, chunk in enumerate(chunks):
+                conn.register('chunk', chunk)
+                conn.execute(f"CREATE TABLE {table} AS SELECT * FROM chunk" if i == 0 else f"INSERT INTO {table} SELECT * FROM chunk")
+                conn.unregister('chunk')
+    finally:
+        conn.close()
+
+def write_sqlite(path, tables):
+    conn = sqlite3.connect(path)
+    try:
+        for table, chunks in tables:
+            for chunk in chunks:
+                chunk.to_sql(table, conn, if_exists='append', index=False)
+        conn.execute("CREATE INDEX ix_factinternetsales_orderdatekey ON factinternetsales (OrderDateKey)")
+        conn.commit()
+    finally:
+        conn.close()
+
+WRITERS = {
+    'duckdb': write_duckdb,
+    'sqlite': write_sqlite,
+}
+
+def export_snapshot(conn, path, engine, chunksize=100000):
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    counts = {}
+
+    def tables():
+        for table in TABLES:
+            counts[table] = 0
+            def chunks(table=table):
+                for chunk in read_chunks(conn, table, chunksize):
+                    counts[table] += len(chunk)
+                    yield chunk
+            yield table, chunks()
+
+    WRITERS[engine](tmp_path, tables())
+    # Readers keep using the previous snapshot until the new one is complete
+    os.replace(tmp_path, path)
+    return counts
+
+def main():
+    from awdata import create_connection, get_backend, get_setting
+
+    parser = argparse.ArgumentParser(description="Copy the AdventureWorks star schema from MySQL into an embedded database file")
+    parser.add_argument('--engine', choices=sorted(WRITERS), default='duckdb')
+    parser.add_argument('--output', default=None, help="defaults to DB_PATH, or awdash.<engine>")
+    parser.add_argument('--chunksize', type=int, default=100000)
+    args = parser.parse_args()
+
+    conn = create_connection(get_backend("mysql"))
+    if conn is None:
+        raise SystemExit("Could not connect to the database")
+    output = args.output or get_setting("DB_PATH", f"awdash.{args.engine}")
+    start = time.perf_counter()
+    try:
+        counts = export_snapshot(conn, output, args.engine, args.chunksize)
+    finally:
+        conn.close()
+
+    for table, rows in counts.items():
+        print(f"{table:<24} {rows:>10} rows")
+    print(f"Snapshot written to {output} in {time.perf_counter() - start:.1f}s; "
+          f"run the dashboard with DB_BACKEND={args.engine} DB_PATH={output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+import datetime
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from awdata import CalendarIndex, ResultCache, age_groups, dimension_generation, result_size
+from sharedcache import SharedResultCache
+
+def test_result_cache_expires_entries_after_ttl():
+    cache = ResultCache(ttl=-1)
+    cache.put(('overview', 2003), 'frames')
+    assert cache.get(('overview', 2003)) == (False, None)
+
+def test_result_cache_evicts_least_recently_used_within_byte_cap():
+    value = 'x' * 100
+    cache = ResultCache(max_bytes=3 * result_size(value))
+    for year in (2001, 2002, 2003):
+        cache.put(('overview', year), value)
+    cache.get(('overview', 2001))
+    cache.put(('overview', 2004), value)
+
+    assert cache.get(('overview', 2002)) == (False, None)
+    assert cache.get(('overview', 2001)) == (True, value)
+    assert cache.stats()['evictions'] == 1
+
+def test_result_cache_clear_by_page():
+    cache = ResultCache()
+    cache.put(('overview', 2003), 'overview')
+    cache.put(('customer', '2005-01-01'), 'customer')
+    cache.clear('overview')
+    assert cache.get(('overview', 2003)) == (False, None)
+    assert cache.get(('customer', '2005-01-01')) == (True, 'customer')
+
+def test_result_cache_clears_when_invalidation_file_changes(tmp_path):
+    marker = tmp_path / 'etl_done'
+    marker.write_text('')
+    cache = ResultCache(invalidation_file=str(marker))
+    cache.put(('overview', 2003), 'frames')
+    os.utime(marker, (time.time() + 10, time.time() + 10))
+    assert cache.get(('overview', 2003)) == (False, None)
+
+def test_result_cache_does_not_cache_failed_loads():
+    cache = ResultCache()
+    assert cache.get_or_compute(('sales', 2003), lambda: None) == ('miss', None)
+    assert cache.get_or_compute(('sales', 2003), lambda: 'frame') == ('miss', 'frame')
+    assert cache.get_or_compute(('sales', 2003), lambda: 'other') == ('hit', 'frame')
+
+def run_concurrently(cache, key, callers=5):
+    calls = []
+    statuses = []
+    barrier = threading.Barrier(callers)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'frame'
+
+    def caller():
+        barrier.wait()
+        statuses.append(cache.get_or_compute(key, compute))
+
+    threads = [threading.Thread(target=caller) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return calls, statuses
+
+def test_result_cache_single_flight():
+    cache = ResultCache()
+    calls, statuses = run_concurrently(cache, ('sales', 2003))
+
+    assert len(calls) == 1
+    assert sorted(status for status, _ in statuses) == ['miss'] + ['wait'] * 4
+    assert all(value == 'frame' for _, value in statuses)
+    assert cache.stats()['waits'] == 4
+
+def make_calendar():
+    # Keys increase with the date, with a gap where dimtime has no rows
+    dates = list(pd.date_range('2003-12-30', '2004-01-03')) + list(pd.date_range('2004-01-10', '2004-01-12'))
+    return CalendarIndex(pd.DataFrame({'TimeKey': range(100, 100 + len(dates)), 'FullDateAlternateKey': dates}))
+
+def test_range_bounds_maps_dates_to_key_range():
+    calendar = make_calendar()
+    assert calendar.range_bounds(datetime.date(2004, 1, 1), datetime.date(2004, 1, 2)) == (102, 103)
+
+def test_range_bounds_snaps_to_dates_present_in_dimtime():
+    calendar = make_calendar()
+    assert calendar.range_bounds(datetime.date(2004, 1, 3), datetime.date(2004, 1, 10)) == (104, 105)
+    assert calendar.range_bounds(datetime.date(2004, 1, 5), datetime.date(2004, 1, 11)) == (105, 106)
+
+def test_range_bounds_empty_range():
+    calendar = make_calendar()
+    assert calendar.range_bounds(datetime.date(2004, 1, 5), datetime.date(2004, 1, 8)) == (0, -1)
+    assert calendar.range_bounds(datetime.date(2005, 1, 1), datetime.date(2005, 12, 31)) == (0, -1)
+
+def test_year_bounds_and_months():
+    calendar = make_calendar()
+    assert calendar.year_bounds(2003) == (100, 101)
+    assert calendar.year_bounds(2004) == (102, 107)
+    assert list(calendar.months([100, 102, 999])[:2]) == [12, 1]
+
+def age_group(birth_date, as_of):
+    return age_groups(pd.Series(pd.to_datetime([birth_date])), as_of)[0]
+
+def test_age_groups_count_whole_years_like_timestampdiff():
+    as_of = datetime.date(2005, 6, 15)
+    assert age_group('1975-06-16', as_of) == '< 30 Years'
+    assert age_group('1975-06-15', as_of) == '30 - 39 Years'
+    assert age_group('1975-05-31', as_of) == '30 - 39 Years'
+
+def test_age_groups_leap_day_birthdays():
+    # TIMESTAMPDIFF(YEAR, '1976-02-29', '2006-02-28') is 29
+    assert age_group('1976-02-29', datetime.date(2006, 2, 28)) == '< 30 Years'
+    assert age_group('1976-02-29', datetime.date(2006, 3, 1)) == '30 - 39 Years'
+
+def test_age_groups_band_edges():
+    as_of = datetime.date(2005, 1, 1)
+    assert age_group('1935-01-02', as_of) == '60 - 69 Years'
+    assert age_group('1935-01-01', as_of) == '> 70 Years'
+    assert age_group('1945-01-01', as_of) == '60 - 69 Years'
+    assert age_group('1955-01-02', as_of) == '40 - 49 Years'
+
+def test_age_groups_missing_birth_date_falls_in_last_band():
+    groups = age_groups(pd.Series(pd.to_datetime(['1975-06-15', None])), datetime.date(2005, 6, 15))
+    assert list(groups) == ['30 - 39 Years', '> 70 Years']
+
+def shared_cache(tmp_path, **kwargs):
+    return SharedResultCache(str(tmp_path / 'results.sqlite'), **kwargs)
+
+def test_shared_cache_round_trip_and_ttl(tmp_path):
+    cache = shared_cache(tmp_path)
+    cache.put(('overview', 2003), {'sales': [1, 2, 3]})
+    assert cache.get(('overview', 2003)) == (True, {'sales': [1, 2, 3]})
+
+    expired = shared_cache(tmp_path, ttl=-1)
+    expired.put(('overview', 2004), 'frames')
+    assert expired.get(('overview', 2004)) == (False, None)
+
+def test_shared_cache_evicts_least_recently_used_within_byte_cap(tmp_path):
+    value = 'x' * 1000
+    cache = shared_cache(tmp_path, max_bytes=3 * len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+    for year in (2001, 2002, 2003):
+        cache.put(('overview', year), value)
+        time.sleep(0.01)
+    cache.put(('overview', 2004), value)
+
+    assert cache.get(('overview', 2001)) == (False, None)
+    assert cache.get(('overview', 2004)) == (True, value)
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['entries'] == 3
+
+def test_shared_cache_hits_do_not_write_back_recent_entries(tmp_path):
+    cache = shared_cache(tmp_path)
+    cache.put(('overview', 2003), 'frames')
+    with sqlite3.connect(cache.path) as conn:
+        before = conn.execute("SELECT last_used FROM entries").fetchone()[0]
+    cache.get(('overview', 2003))
+    with sqlite3.connect(cache.path) as conn:
+        assert conn.execute("SELECT last_used FROM entries").fetchone()[0] == before
+
+def test_shared_cache_clear_by_page(tmp_path):
+    cache = shared_cache(tmp_path)
+    cache.put(('overview', 2003), 'overview')
+    cache.put(('customer', '2005-01-01'), 'customer')
+    cache.clear('overview')
+    assert cache.get(('overview', 2003)) == (False, None)
+    assert cache.get(('customer', '2005-01-01')) == (True, 'customer')
+
+def test_shared_cache_invalidation_is_shared_between_processes(tmp_path):
+    marker = tmp_path / 'etl_done'
+    marker.write_text('')
+    first = shared_cache(tmp_path, invalidation_file=str(marker))
+    second = shared_cache(tmp_path, invalidation_file=str(marker))
+    first.put(('overview', 2003), 'stale')
+    assert second.get(('overview', 2003)) == (True, 'stale')
+
+    os.utime(marker, (time.time() + 10, time.time() + 10))
+    assert second.get(('overview', 2003)) == (False, None)
+    # The other instance sees the same mtime already handled and keeps new entries
+    second.put(('overview', 2003), 'fresh')
+    assert first.get(('overview', 2003)) == (True, 'fresh')
+
+def test_shared_cache_single_flight_removes_lock_files(tmp_path):
+    cache = shared_cache(tmp_path)
+    calls, statuses = run_concurrently(cache, ('sales', 2003))
+
+    assert len(calls) == 1
+    assert sorted(status for status, _ in statuses) == ['miss'] + ['wait'] * 4
+    assert all(value == 'frame' for _, value in statuses)
+    assert os.listdir(cache.lock_dir) == []
+
+def test_dimension_generation_follows_invalidation_file(tmp_path, monkeypatch):
+    marker = tmp_path / 'etl_done'
+    marker.write_text('')
+    monkeypatch.setenv('AWDASH_CACHE_INVALIDATION_FILE', str(marker))
+    monkeypatch.setenv('AWDASH_CACHE_TTL', '1e12')
+    before = dimension_generation()
+    assert dimension_generation() == before
+    os.utime(marker, (time.time() + 10, time.time() + 10))
+    assert dimension_generation() != before
@@ -0,0 +1,29 @@
+import os
+import threading
+
+from tts import AudioCache
+
+def test_audio_cache_concurrent_puts_of_same_key(tmp_path):
+    cache = AudioCache(str(tmp_path))
+    writers = 8
+    barrier = threading.Barrier(writers)
+    errors = []
+
+    def writer():
+        barrier.wait()
+        try:
+            for _ in range(25):
+                cache.put('clip', 'audio/mp3', b'audio' * 1000)
+        except OSError as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert os.listdir(tmp_path) == ['clip.mp3']
+    with open(tmp_path / 'clip.mp3', 'rb') as f:
+        assert f.read() == b'audio' * 1000
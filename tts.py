@@ -0,0 +1,145 @@
+import hashlib
+import importlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from awdata import get_setting
+from instrumentation import describe_result, measure
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = {}
+
+def register_backend(name, audio_format='audio/mp3'):
+    def decorator(func):
+        BACKENDS[name] = (func, audio_format)
+        return func
+    return decorator
+
+@register_backend('gtts', audio_format='audio/mp3')
+def synthesize_gtts(text, lang):
+    # Imported lazily so offline deployments with a local backend don't need gTTS installed
+    from gtts import gTTS, gTTSError
+
+    buffer = io.BytesIO()
+    try:
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+    except gTTSError as err:
+        # Backends report synthesis failures as RuntimeError
+        raise RuntimeError(str(err)) from err
+    return buffer.getvalue()
+
+def get_backend(name):
+    # Unregistered names are "module:function" paths to a callable taking (text, lang)
+    if name not in BACKENDS:
+        module_name, func_name = name.split(':')
+        func = getattr(importlib.import_module(module_name), func_name)
+        BACKENDS[name] = (func, getattr(func, 'audio_format', 'audio/wav'))
+    return BACKENDS[name]
+
+class AudioCache:
+    def __init__(self, cache_dir, max_bytes=50 * 2**20, memory_entries=16):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key, audio_format):
+        return os.path.join(self.cache_dir, f"{key}.{audio_format.split('/')[-1]}")
+
+    def get(self, key, audio_format):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self._path(key, audio_format)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Reads refresh the mtime, which is what eviction orders by
+            os.utime(path)
+        except OSError:
+            return None
+        self._remember(key, data)
+        return data
+
+    def put(self, key, audio_format, data):
+        path = self._path(key, audio_format)
+        # A temp file per writer, so a session and the pre-warm thread (or another replica)
+        # storing the same clip at once don't move each other's file away
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, delete=False, suffix='.tmp') as f:
+            f.write(data)
+        os.replace(f.name, path)
+        self._remember(key, data)
+        self._evict()
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+@st.cache_resource
+def get_audio_cache():
+    return AudioCache(
+        get_setting("TTS_CACHE_DIR", ".tts_cache"),
+        max_bytes=int(float(get_setting("TTS_CACHE_MAX_MB", 50)) * 2**20),
+    )
+
+def cache_key(text, lang, backend):
+    return hashlib.sha256(f"{backend}\0{lang}\0{text}".encode('utf-8')).hexdigest()
+
+def text_to_speech(text, lang='id', backend=None):
+    backend = backend or get_setting("TTS_BACKEND", "gtts")
+    synthesize, audio_format = get_backend(backend)
+    cache = get_audio_cache()
+    key = cache_key(text, lang, backend)
+
+    with measure("tts", backend) as record:
+        data = cache.get(key, audio_format)
+        record['cache'] = 'miss' if data is None else 'hit'
+        if data is None:
+            data = synthesize(text, lang)
+            cache.put(key, audio_format, data)
+        describe_result(record, data)
+    return data, audio_format
+
+def prewarm(texts, lang='id'):
+    for text in texts:
+        try:
+            text_to_speech(text, lang)
+        except (ImportError, OSError, RuntimeError, ValueError) as err:
+            # Only the pre-warm is lost; the button synthesizes on demand
+            logger.warning("TTS pre-warm failed: %s", err)
+
+@st.cache_resource
+def start_prewarm(texts, lang='id'):
+    thread = threading.Thread(target=prewarm, args=(texts, lang), daemon=True)
+    thread.start()
+    return thread